@@ -3,6 +3,7 @@ from discord.ext import commands
 import os
 import config
 from config import TOKEN
+from utils.http_client import get_http_client
 
 bot = commands.Bot(command_prefix="Dracula ", intents=discord.Intents.all())
 
@@ -34,6 +35,13 @@ async def reload_cogs(ctx):
     else:
         await ctx.send("Successfully reloaded all cogs.")
 
+@bot.command(name="httpstats")
+@commands.is_owner()
+async def http_stats(ctx):
+    """Shows request counts, latency and bytes for the shared HTTP client."""
+    stats = get_http_client().stats()
+    await ctx.send("\n".join(f"{key}: {value}" for key, value in stats.items()))
+
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user} (ID: {bot.user.id})")
@@ -41,7 +49,10 @@ async def on_ready():
 async def main():
     # Load cogs, then start the bot
     await load_extensions()
-    await bot.start(config.TOKEN)  # or your token of choice
+    try:
+        await bot.start(config.TOKEN)  # or your token of choice
+    finally:
+        await get_http_client().close()
 
 if __name__ == "__main__":
     import asyncio
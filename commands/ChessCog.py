@@ -1,80 +1,159 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
 import chess
-import chess.svg
-import cairosvg
-import time
+from utils.chess_render import BoardRenderer
+from utils.chess_games import GameRegistry
+from utils.chess_engine import best_move, benchmark
+from utils.worker_pool import WorkerPool, QueueFullError
+
+ABANDON_AFTER_HOURS = 48  # Games with no move for this long are removed
+CLEANUP_INTERVAL_MINUTES = 30
+ENGINE_MOVE_SECONDS = 3  # Search time the bot spends per move
+ENGINE_WORKERS = 1  # Worker processes running searches
+ENGINE_MAX_PENDING = 8  # Searches running or waiting before new ones are refused
+BENCHMARK_SECONDS = 2  # Search time per benchmark position
 
 class ChessCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.current_game = None
-        self.current_players = None
-        self.board_images = []
+        # Every game in progress, keyed by channel/thread and player pair; survives restarts.
+        self.games = GameRegistry(engine_id=bot.user.id if bot.user else None)
+        # Piece sprites are rasterized once here; positions are composited in memory.
+        self.renderer = BoardRenderer()
+        # Searches run in a worker process so they never block the event loop.
+        self.engine = WorkerPool(ENGINE_WORKERS, ENGINE_MAX_PENDING, ENGINE_MOVE_SECONDS * 4 + 10)
+        self.thinking = set()  # Keys of games the engine is currently searching
+        self.cleanup_games.start()
         print("ChessCog loaded!")
 
-    def board_to_image(self, board: chess.Board, white_player: str, black_player: str, move_number: int):
+    def cog_unload(self):
+        self.cleanup_games.cancel()
+        self.engine.shutdown()
+        self.games.close()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # The bot's own ID is only known after login; its games don't count toward one game per channel.
+        self.games.set_engine(self.bot.user.id)
+
+    def board_to_image(self, board: chess.Board, orientation: chess.Color = chess.WHITE) -> discord.File:
         """Generate an image of the current chess board as a PNG."""
-        svg_data = chess.svg.board(board=board)
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        image_path = f"/tmp/chess_board_{timestamp}_{white_player}_vs_{black_player}_move_{move_number}.png"
-        cairosvg.svg2png(bytestring=svg_data, write_to=image_path)
-        self.board_images.append(image_path)
-        return image_path
+        return discord.File(self.renderer.render(board, orientation), filename="chess_board.png")
+
+    async def engine_reply(self, ctx, game):
+        """Has the engine play the bot's move in a single-player game."""
+        if game.key in self.thinking:
+            await ctx.send("I'm still thinking about my move.")
+            return
+        self.thinking.add(game.key)
+        try:
+            async with ctx.typing():
+                result = await self.engine.run(best_move, game.start_fen, list(game.moves), ENGINE_MOVE_SECONDS)
+        except QueueFullError:
+            await ctx.send("The chess engine is busy. Send `!move` again in a moment and I'll play my move.")
+            return
+        except asyncio.TimeoutError:
+            await ctx.send("I took too long to find a move. Send `!move` again and I'll retry.")
+            return
+        finally:
+            self.thinking.discard(game.key)
+        if self.games.games.get(game.key) is not game:
+            return  # Resigned or cleaned up while the engine was thinking
+        board = game.board()
+        engine_move = chess.Move.from_uci(result["move"])
+        san = board.san(engine_move)
+        board.push(engine_move)
+        self.games.record_move(game, engine_move)
+        await ctx.send(f"My move: {san} ({result['move']})", file=self.board_to_image(board))
+        if board.is_game_over():
+            await ctx.send(f"Game over! Result: {board.result()}")
+            self.games.finish(game)
+
+    @tasks.loop(minutes=CLEANUP_INTERVAL_MINUTES)
+    async def cleanup_games(self):
+        """Removes games nobody has moved in for ABANDON_AFTER_HOURS."""
+        expired = self.games.expire(ABANDON_AFTER_HOURS * 3600)
+        if expired:
+            print(f"Removed {len(expired)} abandoned chess games.")
 
     @commands.command(name="start_chess")
     async def start_chess(self, ctx, opponent: discord.Member):
-        if self.current_game is not None:
-            await ctx.send("A game is already in progress. Finish it first or wait.")
-            return
-        if opponent.bot:
+        """
+        Starts a game against another member in this channel. Several games can run at once.
+        Challenge the bot itself for a single-player game.
+        """
+        if opponent.bot and opponent.id != self.bot.user.id:
             await ctx.send("You cannot play against a bot in two-player mode.")
             return
-        self.current_game = chess.Board()
-        self.current_players = (ctx.author, opponent)
+        try:
+            game = self.games.start(ctx.channel.id, ctx.author.id, opponent.id)
+        except ValueError:
+            who = "You already have" if opponent.id == self.bot.user.id else "One of you already has"
+            await ctx.send(f"{who} a game in progress in this channel. Finish it first or `resign`.")
+            return
         await ctx.send(
             f"New chess game started between {ctx.author.mention} (White) and {opponent.mention} (Black)! Use `!move e2e4` to move."
         )
-        image_path = self.board_to_image(
-            self.current_game,
-            ctx.author.display_name,
-            opponent.display_name,
-            0
-        )
-        await ctx.send(file=discord.File(image_path))
+        await ctx.send(file=self.board_to_image(game.board()))
 
     @commands.command(name="move")
     async def move(self, ctx, move: str):
-        if self.current_game is None:
-            await ctx.send("No game in progress. Use `!start_chess @user` to begin.")
+        """Plays a move (in UCI, e.g. e2e4) in your game in this channel."""
+        game = self.games.find(ctx.channel.id, ctx.author.id)
+        if game is None:
+            await ctx.send("You have no game in progress here. Use `!start_chess @user` to begin.")
             return
-        if self.current_players is None or ctx.author.id not in (self.current_players[0].id, self.current_players[1].id):
-            await ctx.send("You are not a player in the current chess game.")
+        board = game.board()
+        if game.player_to_move(board) == self.bot.user.id:
+            # The engine's last attempt failed; play its move now.
+            await self.engine_reply(ctx, game)
             return
-        current_turn_player = self.current_players[0] if self.current_game.turn else self.current_players[1]
-        if ctx.author.id != current_turn_player.id:
+        if ctx.author.id != game.player_to_move(board):
             await ctx.send("It's not your turn.")
             return
         try:
             chess_move = chess.Move.from_uci(move)
-            if chess_move in self.current_game.legal_moves:
-                self.current_game.push(chess_move)
-                move_number = self.current_game.fullmove_number
-                image_path = self.board_to_image(
-                    self.current_game,
-                    self.current_players[0].display_name,
-                    self.current_players[1].display_name,
-                    move_number
-                )
-                await ctx.send(f"Move made: {move}", file=discord.File(image_path))
-                if self.current_game.is_game_over():
-                    await ctx.send(f"Game over! Result: {self.current_game.result()}")
-                    self.current_game = None
-                    self.current_players = None
+            if chess_move in board.legal_moves:
+                board.push(chess_move)
+                self.games.record_move(game, chess_move)
+                await ctx.send(f"Move made: {move}", file=self.board_to_image(board))
+                if board.is_game_over():
+                    await ctx.send(f"Game over! Result: {board.result()}")
+                    self.games.finish(game)
+                elif game.player_to_move(board) == self.bot.user.id:
+                    await self.engine_reply(ctx, game)
             else:
                 await ctx.send("Illegal move. Try again.")
         except ValueError:
             await ctx.send("Invalid move format. Use standard UCI (e.g., e2e4).")
 
+    @commands.command(name="resign")
+    async def resign(self, ctx):
+        """Resigns your game in this channel."""
+        game = self.games.find(ctx.channel.id, ctx.author.id)
+        if game is None:
+            await ctx.send("You have no game in progress here.")
+            return
+        self.games.finish(game)
+        result = "0-1" if ctx.author.id == game.white_id else "1-0"
+        await ctx.send(f"{ctx.author.mention} resigned. Result: {result}")
+
+    @commands.command(name="chessbench")
+    @commands.is_owner()
+    async def chess_benchmark(self, ctx, seconds: float = BENCHMARK_SECONDS):
+        """Measures the engine's nodes per second on this machine, to tune ENGINE_MOVE_SECONDS."""
+        seconds = max(0.5, min(seconds, 4))
+        await ctx.send(f"Benchmarking the chess engine for about {seconds * 4:.0f} seconds...")
+        try:
+            result = await self.engine.run(benchmark, seconds)
+        except (QueueFullError, asyncio.TimeoutError):
+            await ctx.send("The chess engine is busy, try again later.")
+            return
+        await ctx.send(
+            f"{result['nodes']} nodes in {result['seconds']:.1f}s = {result['nps']} nodes/s. "
+            f"Depths reached: {', '.join(map(str, result['depths']))}."
+        )
+
 async def setup(bot):
     await bot.add_cog(ChessCog(bot))
@@ -1,63 +1,97 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from config import IGNORE_CHANNELS  # Import the list of channels to ignore for censorship
 
 # Import helper functions from the utils package
 from utils.helpers import get_emoji_str
-from utils.file_io import save_json, load_json
+from utils.file_io import load_json
+from utils.reaction_store import ReactionStore
+from utils.reaction_crawler import ReactionCrawler
 
-REACTION_DATA_FILE = "reaction_data.json"
+REACTION_DATA_FILE = "reaction_data.json"  # Legacy format, imported once into the store
+REACTION_FLUSH_SECONDS = 5  # Live reaction events are committed in batches at this interval
 
 class ModerationCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.reaction_data = load_json(REACTION_DATA_FILE) or {}
+        self.store = ReactionStore()
+        self.rebuilding = False
+        if self.store.is_empty():
+            legacy_data = load_json(REACTION_DATA_FILE)
+            if legacy_data:
+                self.store.import_json(legacy_data)
+                print("DEBUG: Imported legacy reaction data into the store.")
+        self.flush_reactions.start()
 
-    def save_data(self):
-        """Saves the reaction data using the file_io utility."""
-        save_json(REACTION_DATA_FILE, self.reaction_data)
-        print("DEBUG: Reaction data saved.")
+    def cog_unload(self):
+        self.flush_reactions.cancel()
+        self.store.close()
+
+    @tasks.loop(seconds=REACTION_FLUSH_SECONDS)
+    async def flush_reactions(self):
+        """Commits reaction events buffered since the last flush in a single transaction."""
+        if self.store.pending_writes:
+            self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        if payload.guild_id is None:
+            return
+        author_id = getattr(payload, "message_author_id", None)
+        self.store.upsert_message(payload.message_id, author_id, payload.channel_id)
+        self.store.add_reaction(payload.message_id, get_emoji_str(payload.emoji), payload.user_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if payload.guild_id is None:
+            return
+        self.store.remove_reaction(payload.message_id, get_emoji_str(payload.emoji), payload.user_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        self.store.clear_reactions(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        self.store.clear_reactions(payload.message_id, get_emoji_str(payload.emoji))
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        self.store.delete_message(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.store.delete_message(message_id)
 
     @commands.command(name="rebuild_reactions")
     @commands.has_permissions(administrator=True)
-    async def rebuild_reactions(self, ctx):
-        """Reconstructs the reaction data from scratch."""
-        await ctx.send("Starting reaction reconstruction. This may take some time...")
-        self.reaction_data = {}
-        self.save_data()
-        print("DEBUG: Reaction database cleared.")
-        total_messages_scanned = 0
-        total_reactions_updated = 0
-        for channel in ctx.guild.text_channels:
-            try:
-                async for message_obj in channel.history(limit=None):
-                    total_messages_scanned += 1
-                    msg_id = str(message_obj.id)
-                    author_id = str(message_obj.author.id) if message_obj.author else "Unknown"
-                    self.reaction_data[msg_id] = {"author_id": author_id, "reactions": {}}
-                    for reaction in message_obj.reactions:
-                        emoji_str = get_emoji_str(reaction.emoji)
-                        self.reaction_data[msg_id]["reactions"][emoji_str] = {
-                            "users_given": [],
-                            "count_given": 0,
-                            "users_received": [],
-                            "count_received": 0
-                        }
-                        async for user in reaction.users():
-                            user_id = str(user.id)
-                            if user_id not in self.reaction_data[msg_id]["reactions"][emoji_str]["users_given"]:
-                                self.reaction_data[msg_id]["reactions"][emoji_str]["users_given"].append(user_id)
-                                self.reaction_data[msg_id]["reactions"][emoji_str]["count_given"] += 1
-                            if user_id != author_id and user_id not in self.reaction_data[msg_id]["reactions"][emoji_str]["users_received"]:
-                                self.reaction_data[msg_id]["reactions"][emoji_str]["users_received"].append(user_id)
-                                self.reaction_data[msg_id]["reactions"][emoji_str]["count_received"] += 1
-                            total_reactions_updated += 1
-            except discord.Forbidden:
-                continue
-        self.save_data()
+    async def rebuild_reactions(self, ctx, mode: str = None):
+        """
+        Reconstructs the reaction data from scratch.
+        Live reaction events keep the data current, so this is only needed after data loss.
+        An interrupted rebuild resumes where it stopped; pass "fresh" to start over.
+        """
+        if self.rebuilding:
+            await ctx.send("A reaction rebuild is already running.")
+            return
+        self.rebuilding = True
+        try:
+            if mode == "fresh" or not self.store.crawl_checkpoints():
+                self.store.clear()
+                print("DEBUG: Reaction database cleared.")
+                progress_message = await ctx.send("Starting reaction reconstruction. This may take some time...")
+            else:
+                progress_message = await ctx.send("Resuming the interrupted reaction reconstruction...")
+            # Also on resume, so channels created since the crawl started get a checkpoint row.
+            self.store.start_crawl(channel.id for channel in ctx.guild.text_channels)
+            crawler = ReactionCrawler(self.store, ctx.guild.text_channels)
+            await crawler.run(progress_message)
+        finally:
+            self.rebuilding = False
         await ctx.send(
-            f"Reconstruction complete! Messages scanned: {total_messages_scanned}, "
-            f"Reactions updated: {total_reactions_updated}"
+            f"Reconstruction complete! Messages scanned: {crawler.messages_scanned}, "
+            f"Reactions updated: {crawler.reactions_updated}"
         )
 
     @commands.command(name="print_credit")
@@ -65,15 +99,7 @@ class ModerationCog(commands.Cog):
         """Prints the reaction credits (unique reactions received) for the member."""
         if member is None:
             member = ctx.author
-        self.reaction_data = load_json(REACTION_DATA_FILE) or {}
-        reactions_received = {}
-        for message_id, info in self.reaction_data.items():
-            if "author_id" not in info or "reactions" not in info:
-                continue
-            if str(info["author_id"]) == str(member.id):
-                for emoji, details in info["reactions"].items():
-                    unique_users = set(details["users_received"]) - {str(member.id)}
-                    reactions_received[emoji] = reactions_received.get(emoji, 0) + len(unique_users)
+        reactions_received = self.store.received_by(member.id)
         if not reactions_received:
             await ctx.send(f"**{member.display_name}** has not received any reactions.")
             return
@@ -87,14 +113,7 @@ class ModerationCog(commands.Cog):
         """Prints the reaction debits (reactions given) for the member."""
         if member is None:
             member = ctx.author
-        self.reaction_data = load_json(REACTION_DATA_FILE) or {}
-        reactions_given = {}
-        for message_id, info in self.reaction_data.items():
-            if "reactions" not in info:
-                continue
-            for emoji, details in info["reactions"].items():
-                if str(member.id) in details["users_given"]:
-                    reactions_given[emoji] = reactions_given.get(emoji, 0) + 1
+        reactions_given = self.store.given_by(member.id)
         if not reactions_given:
             await ctx.send(f"**{member.display_name}** has not given any reactions.")
             return
@@ -108,21 +127,7 @@ class ModerationCog(commands.Cog):
         """Prints the net reaction balance for the member."""
         if member is None:
             member = ctx.author
-        self.reaction_data = load_json(REACTION_DATA_FILE) or {}
-        balance = {}
-        for message_id, message_info in self.reaction_data.items():
-            if "reactions" not in message_info or "author_id" not in message_info:
-                continue
-            for emoji, details in message_info["reactions"].items():
-                emoji_str = get_emoji_str(emoji)
-                if str(message_info["author_id"]) == str(member.id):
-                    received_count = len(set(details["users_received"]))
-                else:
-                    received_count = 0
-                given_count = 1 if str(member.id) in details["users_given"] else 0
-                net = received_count - given_count
-                if net != 0:
-                    balance[emoji_str] = balance.get(emoji_str, 0) + net
+        balance = self.store.balance_of(member.id)
         if not balance:
             await ctx.send(f"**{member.display_name}** has no reaction balance.")
             return
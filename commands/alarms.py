@@ -1,55 +1,123 @@
 import discord
 from discord.ext import commands, tasks
+import asyncio
+import heapq
 import json
 import os
+import typing
 from datetime import datetime
+from utils.delivery import DeliveryQueue
+from utils.recurrence import next_fire
+
+REMINDER_SAVE_SECONDS = 5  # Changes are written to reminders.json at most this often
 
 class AlarmsCog(commands.Cog):
     """
     Base cog for alarm/reminder functionality.
-    Reminders are stored in a JSON file and checked periodically.
+    Reminders are stored in a JSON file and kept in a min-heap of due times,
+    so the scheduler sleeps exactly until the next reminder is due.
+    A reminder may recur (its "time" is always the next fire time) and may
+    target a role or channel, in which case it is fanned out to every member.
     Other cogs can extend this class to add further alarm-related features.
     """
     def __init__(self, bot):
         self.bot = bot
         self.reminder_file = "reminders.json"
-        self.reminders = []
+        self.reminders = {}  # id -> reminder dict
+        self.reminder_heap = []  # (due datetime, id); entries for deleted reminders are skipped lazily
+        self.next_id = 1
+        self.wakeup = asyncio.Event()
+        self.scheduler_task = None
+        self.delivery = None
+        self.dirty = False  # Reminders changed since the last save
         self.load_reminders()
-        self.check_reminders.start()
+
+    async def cog_load(self):
+        self.delivery = DeliveryQueue()
+        self.scheduler_task = asyncio.create_task(self.run_scheduler())
+        self.flush_reminders.start()
+
+    def cog_unload(self):
+        if self.scheduler_task:
+            self.scheduler_task.cancel()
+        if self.delivery:
+            self.delivery.close()
+        self.flush_reminders.cancel()
+        if self.dirty:
+            self.dirty = False
+            self.save_reminders()
 
     def load_reminders(self):
         """Load reminders from the JSON file."""
+        reminders = []
         if os.path.exists(self.reminder_file):
             try:
                 with open(self.reminder_file, "r", encoding="utf-8") as f:
-                    self.reminders = json.load(f)
+                    reminders = json.load(f)
             except Exception as e:
                 print(f"Error loading reminders: {e}")
-                self.reminders = []
-        else:
-            self.reminders = []
+        # Older files could hold duplicate IDs; later duplicates get fresh IDs instead of being dropped.
+        self.next_id = max((r["id"] for r in reminders), default=0) + 1
+        self.reminders = {}
+        for r in reminders:
+            if r["id"] in self.reminders:
+                r["id"] = self.next_id
+                self.next_id += 1
+                self.dirty = True
+            self.reminders[r["id"]] = r
+        self.reminder_heap = [(datetime.fromisoformat(r["time"]), r["id"]) for r in reminders]
+        heapq.heapify(self.reminder_heap)
 
-    def save_reminders(self):
-        """Save reminders to the JSON file."""
+    def save_reminders(self, reminders: list = None):
+        """Save reminders (by default the current ones) to the JSON file."""
+        if reminders is None:
+            reminders = list(self.reminders.values())
         try:
-            with open(self.reminder_file, "w", encoding="utf-8") as f:
-                json.dump(self.reminders, f, indent=4)
+            tmp_file = self.reminder_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(reminders, f, indent=4)
+            os.replace(tmp_file, self.reminder_file)
         except Exception as e:
             print(f"Error saving reminders: {e}")
 
-    def add_reminder(self, user_id: int, reminder_time: datetime, message: str):
+    @tasks.loop(seconds=REMINDER_SAVE_SECONDS)
+    async def flush_reminders(self):
+        """
+        Writes reminders changed since the last save. Adds and deletes only touch
+        the dict and heap, so a burst of them costs one file write, off the event loop.
+        """
+        if self.dirty:
+            self.dirty = False  # Cleared before the write, so changes made during it are saved next time
+            snapshot = [dict(r) for r in self.reminders.values()]
+            await asyncio.to_thread(self.save_reminders, snapshot)
+
+    def schedule(self, reminder_id: int, due: datetime):
+        """Push a due time onto the heap, waking the scheduler if it is now the earliest."""
+        heapq.heappush(self.reminder_heap, (due, reminder_id))
+        if self.reminder_heap[0][1] == reminder_id:
+            self.wakeup.set()
+
+    def add_reminder(self, user_id: int, reminder_time: datetime, message: str, repeat: str = None, target: dict = None):
         """
-        Add a reminder to the list and persist it.
+        Add a reminder to the list; it is persisted by the next flush.
+        repeat is a recurrence rule (see utils.recurrence.parse_rule).
+        target is {"type": "role" | "channel", "id": ..., "guild_id": ...}; without it the owner is DMed.
         Returns the reminder dict.
         """
         reminder = {
-            "id": len(self.reminders) + 1,  # Simple incremental ID
+            "id": self.next_id,
             "user_id": user_id,
             "time": reminder_time.isoformat(),
             "message": message
         }
-        self.reminders.append(reminder)
-        self.save_reminders()
+        if repeat:
+            reminder["repeat"] = repeat
+        if target:
+            reminder["target"] = target
+        self.next_id += 1
+        self.reminders[reminder["id"]] = reminder
+        self.schedule(reminder["id"], reminder_time)
+        self.dirty = True
         return reminder
 
     def delete_reminder(self, reminder_id: int, user_id: int):
@@ -57,42 +125,97 @@ class AlarmsCog(commands.Cog):
         Delete a reminder by its ID for the given user.
         Returns True if deleted, False if not found.
         """
-        reminder = next(
-            (r for r in self.reminders if r["id"] == reminder_id and r["user_id"] == user_id),
-            None
-        )
-        if reminder:
-            self.reminders.remove(reminder)
-            self.save_reminders()
+        reminder = self.reminders.get(reminder_id)
+        if reminder and reminder["user_id"] == user_id:
+            del self.reminders[reminder_id]
+            # Its heap entry is discarded when it reaches the top; compact if stale entries pile up.
+            if len(self.reminder_heap) > 2 * len(self.reminders) + 64:
+                self.reminder_heap = [e for e in self.reminder_heap if e[1] in self.reminders]
+                heapq.heapify(self.reminder_heap)
+            self.dirty = True
             return True
         return False
 
     def list_user_reminders(self, user_id: int):
         """Return all reminders for a given user."""
-        return [r for r in self.reminders if r["user_id"] == user_id]
+        return [r for r in self.reminders.values() if r["user_id"] == user_id]
+
+    def pop_due_reminders(self, now: datetime):
+        """Pop every reminder due at or before now off the heap."""
+        due_reminders = []
+        while self.reminder_heap and self.reminder_heap[0][0] <= now:
+            _, reminder_id = heapq.heappop(self.reminder_heap)
+            reminder = self.reminders.pop(reminder_id, None)
+            if reminder:
+                due_reminders.append(reminder)
+        return due_reminders
 
-    @tasks.loop(seconds=30)
-    async def check_reminders(self):
+    def seconds_until_next(self, now: datetime):
+        """Seconds until the earliest live reminder, or None if there are none."""
+        while self.reminder_heap and self.reminder_heap[0][1] not in self.reminders:
+            heapq.heappop(self.reminder_heap)
+        if not self.reminder_heap:
+            return None
+        return (self.reminder_heap[0][0] - now).total_seconds()
+
+    def reminder_recipients(self, reminder):
+        """Resolves the users a reminder is delivered to."""
+        target = reminder.get("target")
+        if not target:
+            user = self.bot.get_user(reminder["user_id"])
+            return [user] if user else []
+        if target["type"] == "role":
+            guild = self.bot.get_guild(target["guild_id"])
+            role = guild.get_role(target["id"]) if guild else None
+            members = role.members if role else []
+        else:
+            channel = self.bot.get_channel(target["id"])
+            members = channel.members if channel else []
+        return [m for m in members if not m.bot]
+
+    def deliver_reminder(self, reminder):
+        """Queues a DM to every recipient of a due reminder."""
+        content = f"⏰ Reminder: {reminder['message']}"
+        for user in self.reminder_recipients(reminder):
+            self.delivery.enqueue(user, content)
+
+    def reschedule(self, reminder, now: datetime):
+        """Advances a recurring reminder to its next fire time and puts it back on the heap."""
+        due = next_fire(reminder["repeat"], datetime.fromisoformat(reminder["time"]), now)
+        reminder["time"] = due.isoformat()
+        self.reminders[reminder["id"]] = reminder
+        self.schedule(reminder["id"], due)
+
+    async def run_scheduler(self):
         """
-        Background task that checks every 30 seconds for any due reminders.
-        Sends a DM to the user when a reminder is due.
+        Background task that sleeps until the next reminder is due, or until
+        a sooner reminder is added, then delivers everything that is due.
         """
-        now = datetime.utcnow()
-        due_reminders = [r for r in self.reminders if datetime.fromisoformat(r["time"]) <= now]
-        if due_reminders:
+        await self.bot.wait_until_ready()
+        while True:
+            self.wakeup.clear()
+            delay = self.seconds_until_next(datetime.utcnow())
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            now = datetime.utcnow()
+            due_reminders = self.pop_due_reminders(now)
             for reminder in due_reminders:
-                user = self.bot.get_user(reminder["user_id"])
-                if user:
+                try:
+                    self.deliver_reminder(reminder)
+                except Exception as e:
+                    print(f"Error delivering reminder {reminder['id']}: {e}")
+                if reminder.get("repeat"):
+                    # A rule that can no longer fire drops its reminder instead of stopping the scheduler.
                     try:
-                        await user.send(f"⏰ Reminder: {reminder['message']}")
+                        self.reschedule(reminder, now)
                     except Exception as e:
-                        print(f"Error sending reminder to user {reminder['user_id']}: {e}")
-                self.reminders.remove(reminder)
-            self.save_reminders()
-
-    @check_reminders.before_loop
-    async def before_check_reminders(self):
-        await self.bot.wait_until_ready()
+                        print(f"Error rescheduling reminder {reminder['id']}, removing it: {e}")
+            if due_reminders:
+                self.dirty = True
 
     # Updated command: accepts separate date and time arguments.
     @commands.command(name="setreminder")
@@ -112,6 +235,47 @@ class AlarmsCog(commands.Cog):
         reminder = self.add_reminder(ctx.author.id, reminder_time, message)
         await ctx.send(f"Reminder set for {reminder_time} UTC with ID {reminder['id']}.")
 
+    @commands.command(name="setrecurring")
+    async def set_recurring(self, ctx, rule: str, date_str: str, time_str: str, *, message: str):
+        """
+        Sets a recurring reminder starting at the given time.
+        Rules: hourly, daily, weekly, every:<N><m|h|d|w>, or "cron:<min> <hour> <day> <month> <weekday>"
+        (crontab numbering: weekday 0 or 7 = Sunday).
+        Example: Dracula setrecurring weekly 2025-01-03 18:00 Game night!
+        """
+        await self.create_reminder(ctx, rule, date_str, time_str, message)
+
+    @commands.command(name="announce")
+    @commands.has_permissions(manage_guild=True)
+    async def announce(self, ctx, target: typing.Union[discord.Role, discord.TextChannel], rule: str, date_str: str, time_str: str, *, message: str):
+        """
+        DMs a reminder to every member of a role or channel.
+        Use "once" as the rule for a one-shot reminder.
+        Example: Dracula announce @Raiders weekly 2025-01-03 18:00 Raid starts now!
+        """
+        kind = "role" if isinstance(target, discord.Role) else "channel"
+        await self.create_reminder(
+            ctx, rule, date_str, time_str, message,
+            target={"type": kind, "id": target.id, "guild_id": ctx.guild.id}
+        )
+
+    async def create_reminder(self, ctx, rule: str, date_str: str, time_str: str, message: str, target: dict = None):
+        """Validates the rule and start time shared by the recurring and fan-out commands."""
+        try:
+            reminder_time = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            await ctx.send("Time format is incorrect. Use YYYY-MM-DD HH:MM (UTC).")
+            return
+        repeat = None if rule.lower() == "once" else rule
+        if repeat:
+            try:
+                next_fire(repeat, reminder_time, datetime.utcnow())  # Also rejects rules that never fire
+            except ValueError as e:
+                await ctx.send(f"Invalid recurrence rule: {e}")
+                return
+        reminder = self.add_reminder(ctx.author.id, reminder_time, message, repeat=repeat, target=target)
+        await ctx.send(f"Reminder set for {reminder_time} UTC with ID {reminder['id']}.")
+
     @commands.command(name="listreminders")
     async def list_reminders(self, ctx):
         """Lists your current reminders."""
@@ -121,7 +285,12 @@ class AlarmsCog(commands.Cog):
             return
         response = "Your reminders:\n"
         for r in user_reminders:
-            response += f"ID: {r['id']} - Time: {r['time']} - Message: {r['message']}\n"
+            response += f"ID: {r['id']} - Time: {r['time']} - Message: {r['message']}"
+            if r.get("repeat"):
+                response += f" - Repeats: {r['repeat']}"
+            if r.get("target"):
+                response += f" - Target: {r['target']['type']} {r['target']['id']}"
+            response += "\n"
         await ctx.send(response)
 
     @commands.command(name="deletereminder")
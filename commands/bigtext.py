@@ -1,73 +1,214 @@
 import discord
 from discord.ext import commands, tasks
+import asyncio
 import os
+import functools
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import pyfiglet
 from gtts import gTTS
-from pydub import AudioSegment
 from config import BIGTEXT_ANON_CHANNEL_ID, MOD_LOG
 from utils.helpers import censor  # Import the censor function
+from utils.cache import TwoTierCache, cache_key
+from utils.audio_concat import merge_clips
+from utils.file_io import load_json, save_json
+from utils.message_queue import MessageQueue
+from collections import defaultdict
+
+TTS_WORKERS = 8  # gTTS requests in flight at once
+TTS_LANG = "en"
+TTS_VOICE = "com"  # gTTS top-level domain, which selects the accent
+TTS_CACHE_DIR = "cache/tts"
+TTS_CACHE_MEMORY = 32 * 1024 * 1024  # Bytes of clips kept in memory
+TTS_CACHE_DISK = 512 * 1024 * 1024  # Bytes of clips kept on disk
+TTS_PREWARM_FILE = "tts_prewarm.txt"  # Most common messages first, one per line (optionally followed by a tab and a count)
+TTS_PREWARM_LIMIT = 1000  # Lines of the prewarm file synthesized at startup
+MERGE_GAP_MS = 0  # Silence between messages in a merged batch; non-zero needs ffmpeg
+MERGE_NORMALIZE = False  # Even out loudness across the merged batch; needs ffmpeg
+FIGLET_FONTS = ["standard", "big", "slant", "banner3", "doom", "small"]  # Fonts users can pick; the first is the default
+FIGLET_CACHE_SIZE = 4096  # Rendered (text, font) pairs kept in memory
+USER_FONTS_FILE = "bigtext_fonts.json"
+QUEUE_FILE = "bigtext_queue.json"
+QUEUE_MAX_MESSAGES = 60  # Messages a channel's queue holds before submitters have to wait for a flush
+FLUSH_MESSAGES = 30  # Queue length that triggers a flush
+FLUSH_AUDIO_SECONDS = 40  # Estimated merged audio length that triggers a flush
+CLIP_SECONDS = 1.2  # Typical length of a spoken 4-character message
+FLUSH_MAX_ATTEMPTS = 3  # Failed flushes in a row before a channel's queued messages are dropped
 
 # Global variables
-messages_buffer = []  # Buffer to store messages
 instant_mode = False  # To toggle instant mode on/off
 
+def normalize_tts(text: str) -> str:
+    """Case and whitespace differences don't change the speech, so they share a cache entry."""
+    return " ".join(text.split()).lower()
+
+def speakable(text: str) -> bool:
+    """gTTS finds nothing to say in text without letters or digits (e.g. "????") and raises."""
+    return any(ch.isalnum() for ch in text)
+
 class BigTextCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot  # Store the bot instance
+        # gTTS is blocking network I/O, so requests run in a bounded thread pool.
+        self.tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS)
+        # Clips keyed by (normalized text, language, voice), so repeated messages need no network call.
+        self.tts_cache = TwoTierCache(TTS_CACHE_DIR, TTS_CACHE_MEMORY, TTS_CACHE_DISK)
+        self.prewarm_task = None
+        # Parsing a FIGlet font file is the expensive part of rendering, so each font is loaded once.
+        self.figlets = {}
+        for font in FIGLET_FONTS:
+            try:
+                self.figlets[font] = pyfiglet.Figlet(font=font)
+            except pyfiglet.FontNotFound:
+                print(f"ERROR: FIGlet font '{font}' not found.")
+        self.render_art = functools.lru_cache(maxsize=FIGLET_CACHE_SIZE)(self._render_art)
+        self.user_fonts = load_json(USER_FONTS_FILE) or {}  # str(user id) -> font name
+        # Queued messages per destination channel, kept on disk so reloads and restarts don't lose them.
+        self.queue = MessageQueue(QUEUE_FILE, QUEUE_MAX_MESSAGES)
+        self.flush_locks = defaultdict(asyncio.Lock)
+        self.flush_failures = defaultdict(int)  # channel id -> failed flushes in a row
         # Start the background task to flush every 10 minutes.
         self.auto_flush_task.start()
 
+    async def cog_load(self):
+        self.prewarm_task = asyncio.create_task(self.prewarm())
+
     def cog_unload(self):
         # Cancel the background task when the cog is unloaded.
         self.auto_flush_task.cancel()
+        if self.prewarm_task is not None:
+            self.prewarm_task.cancel()
+        self.tts_pool.shutdown(wait=False, cancel_futures=True)
 
-    def text_to_speech(self, text, filename):
-        """Converts text to speech and saves it as an MP3 file."""
-        tts = gTTS(text)
-        tts.save(filename)
+    def _render_art(self, text: str, font: str) -> str:
+        return self.figlets[font].renderText(text)
 
-    def merge_audio_files(self, audio_files, output_file):
-        """Merges multiple MP3 files into one."""
-        combined = AudioSegment.empty()
-        for file in audio_files:
-            audio = AudioSegment.from_file(file)
-            combined += audio
-        combined.export(output_file, format="mp3")
+    def font_for(self, user_id: int) -> str:
+        """Returns the user's chosen font, or the default if they haven't picked an available one."""
+        font = self.user_fonts.get(str(user_id))
+        return font if font in self.figlets else next(iter(self.figlets))
 
-    async def flush_buffer(self):
+    def text_to_speech(self, text) -> bytes:
+        """Converts text to speech and returns the MP3 data, using the clip cache when possible."""
+        text = normalize_tts(text)
+        key = cache_key("tts", text, TTS_LANG, TTS_VOICE)
+        clip = self.tts_cache.get(key)
+        if clip is None:
+            buffer = BytesIO()
+            gTTS(text, lang=TTS_LANG, tld=TTS_VOICE).write_to_fp(buffer)
+            clip = buffer.getvalue()
+            try:
+                self.tts_cache.put(key, clip)
+            except OSError as e:
+                print(f"ERROR: Could not cache TTS clip: {e}")
+        return clip
+
+    async def synthesize(self, texts) -> list:
         """
-        Merges buffered 4-character DM messages into a single audio file and posts it 
-        to the BIGTEXT_ANON_CHANNEL_ID, then clears the buffer.
+        Converts each text to speech concurrently in the TTS pool; returns MP3 data in order.
+        A text that fails is logged and gets None, so it can't fail the rest of the batch.
         """
-        global messages_buffer
-        if not messages_buffer:
-            return
-        channel = self.bot.get_channel(BIGTEXT_ANON_CHANNEL_ID)
-        if not channel:
-            print("ERROR: Big text anon channel not found.")
-            messages_buffer.clear()
-            return
-        audio_files = []
-        for idx, (text, user_id) in enumerate(messages_buffer):
-            filename = f"/tmp/message_{idx}.mp3"
-            self.text_to_speech(text, filename)
-            audio_files.append(filename)
-        output_file = "/tmp/combined_messages.mp3"
-        self.merge_audio_files(audio_files, output_file)
-        await channel.send(file=discord.File(output_file))
-        for f in audio_files:
-            os.remove(f)
-        os.remove(output_file)
-        messages_buffer.clear()
+        texts = [normalize_tts(text) for text in texts]
+        loop = asyncio.get_running_loop()
+        unique = list(dict.fromkeys(texts))  # Repeats within a batch are synthesized once
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self.tts_pool, self.text_to_speech, text) for text in unique), return_exceptions=True
+        )
+        by_text = {}
+        for text, result in zip(unique, results):
+            if isinstance(result, Exception):
+                print(f"ERROR: TTS failed for {text!r}: {result}")
+                result = None
+            by_text[text] = result
+        return [by_text[text] for text in texts]
+
+    async def prewarm(self) -> int:
+        """Fills the clip cache from TTS_PREWARM_FILE. Returns the number of entries processed."""
+        if not os.path.exists(TTS_PREWARM_FILE):
+            return 0
+        with open(TTS_PREWARM_FILE, "r", encoding="utf-8") as f:
+            texts = [line.split("\t")[0] for line in f if speakable(line.split("\t")[0])][:TTS_PREWARM_LIMIT]
+        try:
+            await self.synthesize(texts)
+        except Exception as e:
+            print(f"ERROR: TTS prewarm failed: {e}")
+        return len(texts)
+
+    def merge_audio_files(self, clips) -> BytesIO:
+        """Merges multiple MP3 clips into one in a single pass."""
+        return BytesIO(merge_clips(clips, gap_ms=MERGE_GAP_MS, normalize=MERGE_NORMALIZE))
+
+    def estimated_seconds(self, channel_id: int) -> float:
+        """Rough length of the merged audio for a channel's queue."""
+        return self.queue.size(channel_id) * (CLIP_SECONDS + MERGE_GAP_MS / 1000)
+
+    async def flush_channel(self, channel_id: int):
+        """
+        Merges the 4-character DM messages queued for a channel into a single
+        audio file and posts it there. One flush runs per channel at a time.
+        Messages are only dequeued once the file is sent. Messages that can't be
+        converted to speech are left out; if the flush fails the messages stay
+        queued, until FLUSH_MAX_ATTEMPTS failures in a row drop them.
+        Returns True if the queue was sent (or empty).
+        """
+        async with self.flush_locks[channel_id]:
+            batch = self.queue.peek(channel_id)
+            if not batch:
+                return True
+            try:
+                channel = self.bot.get_channel(channel_id)
+                if not channel:
+                    raise RuntimeError("Big text anon channel not found.")
+                clips = [clip for clip in await self.synthesize(text for text, user_id in batch) if clip is not None]
+                if not clips:
+                    raise RuntimeError("No message could be converted to speech.")
+                combined = await asyncio.to_thread(self.merge_audio_files, clips)
+                await channel.send(file=discord.File(combined, filename="combined_messages.mp3"))
+            except Exception as e:
+                self.flush_failures[channel_id] += 1
+                if self.flush_failures[channel_id] < FLUSH_MAX_ATTEMPTS:
+                    print(f"ERROR: Flushing {len(batch)} queued messages failed, keeping them queued: {e}")
+                    return False
+                print(f"ERROR: Flushing {len(batch)} queued messages failed {FLUSH_MAX_ATTEMPTS} times, dropping them: {e}")
+                sent = False
+            else:
+                sent = True
+            self.flush_failures.pop(channel_id, None)
+            # Messages queued while this flush ran come after the batch and wait for the next one.
+            self.queue.remove(channel_id, len(batch))
+            return sent
+
+    async def flush_all(self) -> bool:
+        """Flushes every channel's queue. Returns False if any flush failed."""
+        flushed = True
+        for channel_id in self.queue.channels():
+            flushed = await self.flush_channel(channel_id) and flushed
+        return flushed
+
+    async def enqueue(self, channel_id: int, text: str, user_id: int) -> bool:
+        """
+        Queues a message for a channel. When the queue is full the caller waits
+        for it to be flushed first. Returns False if it is still full.
+        """
+        if self.queue.is_full(channel_id):
+            await self.flush_channel(channel_id)
+        return self.queue.add(channel_id, text, user_id)
+
+    async def flush_if_due(self, channel_id: int, text: str):
+        """Flushes once the queue reaches FLUSH_MESSAGES, FLUSH_AUDIO_SECONDS of audio, or someone says "over"."""
+        if (
+            text.lower() == "over"
+            or self.queue.size(channel_id) >= FLUSH_MESSAGES
+            or self.estimated_seconds(channel_id) >= FLUSH_AUDIO_SECONDS
+        ):
+            await self.flush_channel(channel_id)
 
     @tasks.loop(minutes=10)
     async def auto_flush_task(self):
-        """Every 10 minutes (if not in instant mode) flush the buffered messages to TTS audio."""
+        """Every 10 minutes (if not in instant mode) flush queues that haven't reached a flush trigger."""
         if instant_mode:
             return
-        if not messages_buffer:
-            return
-        await self.flush_buffer()
+        await self.flush_all()
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -81,27 +222,27 @@ class BigTextCog(commands.Cog):
             if len(content) == 4:
                 try:
                     # If content is exactly 4 characters, render ASCII art and post to channel
-                    art_text = pyfiglet.figlet_format(content)
+                    art_text = self.render_art(content, self.font_for(message.author.id))
                     target_channel = self.bot.get_channel(BIGTEXT_ANON_CHANNEL_ID)
                     if target_channel is None:
                         await message.channel.send("Error: Target channel not found.")
                         return
+                    # Queue the message for later processing before posting, so a full queue can refuse it.
+                    # Text with nothing to speak only gets its art posted.
+                    has_speech = speakable(content)
+                    if not instant_mode and has_speech and not await self.enqueue(target_channel.id, content, message.author.id):
+                        await message.channel.send("Too many messages are waiting right now, please try again in a moment.")
+                        return
                     await target_channel.send(f"```{art_text}```")
                     await message.channel.send("Your 4-character ASCII art has been posted anonymously!")
 
                     # Handle TTS logic based on instant_mode
-                    if instant_mode:
-                        filename = f"/tmp/{message.author.id}_instant.mp3"
-                        self.text_to_speech(content, filename)
-                        await target_channel.send(file=discord.File(filename))
-                        os.remove(filename)
-                    else:
-                        # Buffer message for later processing
-                        messages_buffer.append((content, message.author.id))
-
-                    # Flush the buffer if the message is "over"
-                    if content.lower() == "over":
-                        await self.flush_buffer()
+                    if instant_mode and has_speech:
+                        clip, = await self.synthesize([content])
+                        if clip is not None:
+                            await target_channel.send(file=discord.File(BytesIO(clip), filename=f"{message.author.id}_instant.mp3"))
+
+                    await self.flush_if_due(target_channel.id, content)
 
                 except Exception as e:
                     await message.channel.send(f"Error generating art: {e}")
@@ -122,11 +263,13 @@ class BigTextCog(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def flush_cmd(self, ctx):
         """Immediately flushes the batch of buffered DM messages (if any)."""
-        if not messages_buffer:
+        if not len(self.queue):
             await ctx.send("No messages in the batch to flush.")
             return
-        await self.flush_buffer()
-        await ctx.send("Batch flushed successfully.")
+        if await self.flush_all():
+            await ctx.send("Batch flushed successfully.")
+        else:
+            await ctx.send("Flushing failed for some messages, see the log for details.")
 
     @commands.command(name="toggle_instant_mode")
     @commands.has_permissions(administrator=True)
@@ -134,12 +277,38 @@ class BigTextCog(commands.Cog):
         """
         Toggles instant_mode on/off.
         When ON, every valid 4-char DM is immediately converted to TTS audio and posted.
-        When OFF, messages are batched every 10 minutes.
+        When OFF, messages are batched until the queue is long enough (or every 10 minutes).
         """
         global instant_mode
         instant_mode = not instant_mode
         state = "ON" if instant_mode else "OFF"
         await ctx.send(f"Instant mode is now **{state}**.")
 
+    @commands.command(name="bigtextfont")
+    async def bigtext_font_cmd(self, ctx, font: str = None):
+        """Picks the font used for your anonymous ASCII art. Without a font, lists the choices."""
+        if font is None or font.lower() not in self.figlets:
+            current = self.font_for(ctx.author.id)
+            choices = ", ".join(f"**{name}**" if name == current else f"`{name}`" for name in self.figlets)
+            await ctx.send(f"Available fonts: {choices}")
+            return
+        self.user_fonts[str(ctx.author.id)] = font.lower()
+        save_json(USER_FONTS_FILE, self.user_fonts)
+        await ctx.send(f"Your ASCII art will now use `{font.lower()}`.\n```{self.render_art('abcd', font.lower())}```")
+
+    @commands.command(name="ttsprewarm")
+    @commands.has_permissions(administrator=True)
+    async def tts_prewarm_cmd(self, ctx):
+        """Synthesizes every message in the prewarm list that isn't cached yet."""
+        count = await self.prewarm()
+        await ctx.send(f"Prewarmed {count} clips from `{TTS_PREWARM_FILE}`.")
+
+    @commands.command(name="ttscache")
+    @commands.is_owner()
+    async def tts_cache_stats(self, ctx):
+        """Shows hit/miss counts and sizes for the TTS clip cache."""
+        stats = self.tts_cache.stats()
+        await ctx.send("\n".join(f"{key}: {value}" for key, value in stats.items()))
+
 async def setup(bot):
     await bot.add_cog(BigTextCog(bot))
@@ -1,55 +1,146 @@
 import discord
 from discord.ext import commands
-import subprocess
 import os
 import asyncio
 import glob
+import json
+import shutil
+import tempfile
+from utils.audio_packer import AudioPacker, pack
+
+CRACKIFY_WORKERS = 3  # spotdl processes running in parallel per job
 
 class CrackifyCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.download_dir = "downloads"  # Directory to store downloaded songs
+        self.download_dir = "downloads"  # Each job gets its own directory under here
         os.makedirs(self.download_dir, exist_ok=True)
+        self.packer = AudioPacker()
 
-    @commands.command(name="crackify")
-    async def crackify(self, ctx, spotify_url: str):
-        """
-        Downloads a song, album, or playlist from YouTube using a Spotify URL and sends it in Discord.
-        """
-        await ctx.send(f"🎵 Fetching `{spotify_url}` ... This may take a while.")
-
-        # Run spotDL to download the song, album, or playlist
-        cmd = ["spotdl", spotify_url, "--output", self.download_dir]
-        process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        stdout, stderr = await process.communicate()
+    def cog_unload(self):
+        self.packer.shutdown()
 
-        if process.returncode != 0:
-            await ctx.send(f"❌ Error downloading: {stderr.decode()}")
-            return
+    async def run_spotdl(self, *args) -> tuple:
+        """Runs spotdl with args and returns (returncode, stderr text)."""
+        process = await asyncio.create_subprocess_exec(
+            "spotdl", *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        return process.returncode, stderr.decode(errors="replace")
 
-        # Find downloaded files (MP3, FLAC, etc.)
-        music_files = glob.glob(os.path.join(self.download_dir, "*.*"))
+    async def list_tracks(self, spotify_url: str, job_dir: str) -> list:
+        """
+        Resolves an album or playlist URL into its track URLs with `spotdl save`.
+        Returns [spotify_url] if it cannot be expanded, so it is downloaded as one unit.
+        """
+        save_file = os.path.join(job_dir, "tracks.spotdl")
+        returncode, _ = await self.run_spotdl("save", spotify_url, "--save-file", save_file)
+        try:
+            with open(save_file, "r", encoding="utf-8") as f:
+                tracks = [song["url"] for song in json.load(f) if song.get("url")]
+        except (OSError, ValueError, TypeError, KeyError):
+            tracks = []
+        return tracks if returncode == 0 and tracks else [spotify_url]
 
-        if not music_files:
-            await ctx.send("❌ No files found after download.")
-            return
+    async def download_worker(self, tracks: asyncio.Queue, finished: asyncio.Queue, job_dir: str, errors: list):
+        """Downloads tracks one at a time into their own directories, queueing each file as soon as it is done."""
+        while True:
+            try:
+                index, track_url = tracks.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            track_dir = os.path.join(job_dir, str(index))
+            os.makedirs(track_dir, exist_ok=True)
+            returncode, stderr = await self.run_spotdl("download", track_url, "--output", track_dir)
+            if returncode != 0:
+                errors.append(stderr.strip().splitlines()[-1] if stderr.strip() else track_url)
+            # Find downloaded files (MP3, FLAC, etc.)
+            for file_path in sorted(glob.glob(os.path.join(track_dir, "*.*"))):
+                await finished.put(file_path)
 
-        await ctx.send(f"✅ Download complete! Uploading {len(music_files)} files...")
+    async def prepare_files(self, ctx, file_paths: list) -> list:
+        """Fits each file under the upload limit, re-encoding or splitting oversized ones."""
+        prepared = []
+        for file_path in file_paths:
+            try:
+                parts = await self.packer.prepare(file_path, os.path.dirname(file_path))
+            except Exception as e:
+                file_size = os.path.getsize(file_path) / (1024 * 1024)  # Convert bytes to MB
+                await ctx.send(f"⚠️ `{os.path.basename(file_path)}` is too large ({file_size:.2f}MB) and could not be shrunk: {e}")
+                parts = []
+            if parts != [file_path]:
+                os.remove(file_path)
+            prepared.extend(parts)
+        return prepared
 
-        # Send each file while respecting Discord's file size limit (25MB for free users, 50MB for Nitro)
-        for file_path in music_files:
-            file_size = os.path.getsize(file_path) / (1024 * 1024)  # Convert bytes to MB
-            if file_size > 25:  # Check if file exceeds Discord's upload limit
-                await ctx.send(f"⚠️ `{os.path.basename(file_path)}` is too large ({file_size:.2f}MB) to send via Discord.")
-            else:
+    async def upload_files(self, ctx, finished: asyncio.Queue) -> int:
+        """
+        Uploads files from the queue until it yields None. Returns the number sent.
+        Files that finish while an upload is in progress are grouped into
+        shared messages, so a backlog drains in as few API calls as possible.
+        """
+        sent = 0
+        done = False
+        while not done:
+            file_path = await finished.get()
+            if file_path is None:
+                break
+            batch = [file_path]
+            while not finished.empty():
+                file_path = finished.get_nowait()
+                if file_path is None:
+                    done = True
+                    break
+                batch.append(file_path)
+            for group in pack(await self.prepare_files(ctx, batch)):
                 try:
-                    await ctx.send(file=discord.File(file_path))
+                    await ctx.send(files=[discord.File(path) for path in group])
+                    sent += len(group)
                 except Exception as e:
-                    await ctx.send(f"❌ Failed to send `{os.path.basename(file_path)}`: {str(e)}")
+                    names = ", ".join(f"`{os.path.basename(path)}`" for path in group)
+                    await ctx.send(f"❌ Failed to send {names}: {str(e)}")
+                for path in group:
+                    os.remove(path)  # Clean up file after sending
+        return sent
+
+    @commands.command(name="crackify")
+    async def crackify(self, ctx, spotify_url: str):
+        """
+        Downloads a song, album, or playlist from YouTube using a Spotify URL and sends it in Discord.
+        Tracks are downloaded in parallel and uploaded as soon as each one finishes;
+        tracks over the upload limit are re-encoded or split into parts.
+        """
+        await ctx.send(f"🎵 Fetching `{spotify_url}` ... This may take a while.")
+        # A private directory per job, so concurrent jobs never pick up each other's files.
+        job_dir = tempfile.mkdtemp(prefix="crackify-", dir=self.download_dir)
+        try:
+            track_urls = await self.list_tracks(spotify_url, job_dir)
+            if len(track_urls) > 1:
+                await ctx.send(f"📀 Found {len(track_urls)} tracks, downloading...")
 
-            os.remove(file_path)  # Clean up file after sending
+            tracks = asyncio.Queue()
+            for item in enumerate(track_urls):
+                tracks.put_nowait(item)
+            finished = asyncio.Queue()
+            errors = []
+            uploader = asyncio.create_task(self.upload_files(ctx, finished))
+            try:
+                await asyncio.gather(*(
+                    self.download_worker(tracks, finished, job_dir, errors)
+                    for _ in range(min(CRACKIFY_WORKERS, len(track_urls)))
+                ))
+            finally:
+                await finished.put(None)
+                sent = await uploader
 
-        await ctx.send("✅ All available songs have been sent!")
+            if errors:
+                await ctx.send(f"❌ {len(errors)} of {len(track_urls)} downloads failed: {errors[0]}")
+            if sent:
+                await ctx.send(f"✅ All available songs have been sent! ({sent} files)")
+            elif not errors:
+                await ctx.send("❌ No files found after download.")
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
 
 async def setup(bot):
     await bot.add_cog(CrackifyCog(bot))
@@ -1,49 +1,72 @@
 import os
+import asyncio
 from discord.ext import commands
-from fuzzywuzzy import process
+from utils.flow_index import FlowIndex
+
+FLOW_FILE = "flow.txt"  # Path to your text file
+FLOW_INDEX_FILE = "flow.idx"  # Persisted search index, rebuilt when flow.txt changes
+MATCH_THRESHOLD = 30  # Minimum score to report a match (score range is 0 to 100)
 
 class FlowCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.index = None
+        self.index_lock = asyncio.Lock()
 
-    @commands.command(name="flow")
-    async def flow(self, ctx, *, query: str):
+    def cog_unload(self):
+        if self.index is not None:
+            self.index.close()
+
+    async def get_index(self):
         """
-        Performs a fuzzy search on a text file (flow.txt) using fuzzywuzzy and returns
-        the line that best matches the provided query.
+        Returns an up-to-date index of flow.txt. Loading and refreshing (which
+        only indexes appended lines) run off the event loop. Call with index_lock held.
         """
-        flow_file = "flow.txt"  # Path to your text file
+        if self.index is None:
+            self.index = await asyncio.to_thread(FlowIndex.load, FLOW_FILE, FLOW_INDEX_FILE)
+        elif self.index.is_stale():
+            await asyncio.to_thread(self.index.refresh)
+            await asyncio.to_thread(self.index.save, FLOW_INDEX_FILE)
+        return self.index
 
-        if not os.path.exists(flow_file):
+    async def search(self, ctx, query: str, limit: int):
+        """Runs a query against the index, reporting problems to ctx. Returns matches or None."""
+        if not os.path.exists(FLOW_FILE):
             await ctx.send("The flow file does not exist.")
-            return
-
-        try:
-            with open(flow_file, "r", encoding="utf-8") as f:
-                # Read all non-empty lines from the file.
-                lines = [line.strip() for line in f if line.strip()]
-        except Exception as e:
-            await ctx.send(f"Error reading the flow file: {e}")
-            return
-
-        if not lines:
-            await ctx.send("The flow file is empty.")
-            return
-
-        # Use fuzzywuzzy to find the best match for the query.
-        # The extractOne function returns a tuple: (best_match, score, index).
-        best_match = process.extractOne(query, lines)
-        if best_match is None:
+            return None
+        # Held through the search so a refresh never remaps the corpus mid-query.
+        async with self.index_lock:
+            try:
+                index = await self.get_index()
+            except Exception as e:
+                await ctx.send(f"Error reading the flow file: {e}")
+                return None
+            if not len(index):
+                await ctx.send("The flow file is empty.")
+                return None
+            matches = [(line, score) for line, score in index.search(query, limit) if score >= MATCH_THRESHOLD]
+        if not matches:
             await ctx.send("No matching line found.")
-            return
+            return None
+        return matches
 
-        match, score, _ = best_match
-        # Define a threshold to ensure the match is good enough.
-        threshold = 30  # Adjust as necessary (score range is 0 to 100)
-        if score < threshold:
-            await ctx.send("No matching line found.")
-        else:
+    @commands.command(name="flow")
+    async def flow(self, ctx, *, query: str):
+        """
+        Performs a fuzzy search on a text file (flow.txt) and returns
+        the line that best matches the provided query.
+        """
+        matches = await self.search(ctx, query, 1)
+        if matches:
+            match, score = matches[0]
             await ctx.send(f"Best match (score {score}): {match}")
 
+    @commands.command(name="flowtop")
+    async def flow_top(self, ctx, count: int, *, query: str):
+        """Returns the best `count` (up to 10) matches from flow.txt for the query."""
+        matches = await self.search(ctx, query, max(1, min(count, 10)))
+        if matches:
+            await ctx.send("\n".join(f"{score}: {line}" for line, score in matches))
+
 async def setup(bot):
     await bot.add_cog(FlowCog(bot))
@@ -1,21 +1,19 @@
 import discord
 from discord.ext import commands
-import requests
+from utils.http_client import get_http_client, HTTPError
 
 class FortniteCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    def fetch_fortnite_shop(self):
+    async def fetch_fortnite_shop(self):
         """Fetches and parses the Fortnite shop JSON from the API."""
         api_url = "https://fortnite-api.com/v2/shop"
         try:
-            response = requests.get(api_url)
-            response.raise_for_status()
-        except requests.RequestException as e:
+            data = await get_http_client().get_json(api_url)
+        except HTTPError as e:
             return f"Error fetching data: {e}"
 
-        data = response.json()
         if "data" not in data or "entries" not in data["data"]:
             return "Invalid JSON format received from API."
 
@@ -42,7 +40,7 @@ class FortniteCog(commands.Cog):
     @commands.command(name="fetch_fortnite_shop")
     async def fetch_shop(self, ctx):
         """Fetches and displays the Fortnite shop details in multiple embeds."""
-        shop_items = self.fetch_fortnite_shop()
+        shop_items = await self.fetch_fortnite_shop()
         if isinstance(shop_items, str):  # Error message returned
             await ctx.send(shop_items)
             return
@@ -1,20 +1,67 @@
 import discord
 from discord.ext import commands
 import re
-import requests
 from io import BytesIO
+import asyncio
 from utils.gif_tools import overlay_text_on_gif
+from utils.worker_pool import WorkerPool, QueueFullError
+from utils.http_client import get_http_client, HTTPError, ResponseTooLarge
+from utils.fonts import font_registry, has_font, preload_fonts, reload_fonts
+from utils.cache import TwoTierCache, cache_key, content_hash
+
+REMIX_WORKERS = 2  # Worker processes rendering GIFs
+REMIX_MAX_PENDING = 8  # Jobs running or waiting before new requests are refused
+REMIX_TIMEOUT = 60  # Seconds before a render is abandoned
+REMIX_MAX_DOWNLOAD = 20 * 1024 * 1024  # Largest source GIF accepted, in bytes
+REMIX_CACHE_DIR = "cache/remix"
+REMIX_CACHE_MEMORY = 128 * 1024 * 1024  # Bytes of sources and renders kept in memory
+REMIX_CACHE_DISK = 2 * 1024 * 1024 * 1024  # Bytes kept on disk
 
 class RemixCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.pool = WorkerPool(REMIX_WORKERS, REMIX_MAX_PENDING, REMIX_TIMEOUT)
+        # Sources are keyed by attachment ID or URL, renders by (source content hash, font, text).
+        self.cache = TwoTierCache(REMIX_CACHE_DIR, REMIX_CACHE_MEMORY, REMIX_CACHE_DISK)
+        # Scanned and loaded up front so worker processes inherit the registry and
+        # loaded fonts, and a missing fonts/ shows at startup.
+        if not reload_fonts():
+            print("No fonts installed, remix will use the built-in font.")
+        preload_fonts()
+
+    def cog_unload(self):
+        self.pool.shutdown()
+
+    async def cached_source(self, source: str, fetch):
+        """
+        Returns the GIF bytes for source (a stable ID for the GIF) from the cache,
+        or awaits fetch() and caches them.
+        """
+        key = cache_key("source", source)
+        gif_data = await asyncio.to_thread(self.cache.get, key)
+        if gif_data is None:
+            gif_data = await fetch()
+            await self.cache_put(key, gif_data)
+        return gif_data
+
+    async def cache_put(self, key: str, value: bytes):
+        """Caches value off the event loop. A failed write is logged, never fatal."""
+        try:
+            await asyncio.to_thread(self.cache.put, key, value)
+        except OSError as e:
+            print(f"Error writing to the remix cache: {e}")
 
     @commands.command(name="remix")
     async def remix(self, ctx, font: str, *, overlay_text: str):
         """
         Remixes a GIF by overlaying the specified text.
         To use, reply to a message containing a GIF (attachment, link, or embed).
+        The caption is sized to fit the GIF's width. See `fonts` for available fonts.
         """
+        font = font.lower()
+        if not has_font(font):
+            await ctx.send(f"Unknown font `{font}`. Available fonts: {', '.join(font_registry()) or 'none'}")
+            return
         if not ctx.message.reference:
             await ctx.send("Please reply to a message containing a GIF (attachment, link, or embed).")
             return
@@ -30,7 +77,8 @@ class RemixCog(commands.Cog):
             for attachment in replied_message.attachments:
                 if attachment.filename.lower().endswith('.gif'):
                     try:
-                        gif_data = await attachment.read()
+                        # Attachment URLs carry expiring signatures, so the attachment ID is the stable key.
+                        gif_data = await self.cached_source(f"attachment:{attachment.id}", attachment.read)
                     except Exception:
                         await ctx.send("Failed to read the attached GIF.")
                         return
@@ -56,23 +104,57 @@ class RemixCog(commands.Cog):
         if gif_data is None and gif_url:
             if "tenor.com" in gif_url and not gif_url.endswith('.gif'):
                 gif_url += ".gif"
-            response = requests.get(gif_url)
-            if response.status_code != 200:
+            try:
+                gif_data = await self.cached_source(
+                    gif_url, lambda: get_http_client().get_bytes(gif_url, max_bytes=REMIX_MAX_DOWNLOAD)
+                )
+            except ResponseTooLarge:
+                await ctx.send("That GIF is too large to remix.")
+                return
+            except HTTPError:
                 await ctx.send("Failed to download the GIF.")
                 return
-            gif_data = response.content
 
         if gif_data is None:
             await ctx.send("The replied message does not contain a valid GIF attachment, link, or embed.")
             return
 
+        render_key = cache_key("render", content_hash(gif_data), font, overlay_text)
+        rendered = await asyncio.to_thread(self.cache.get, render_key)
+        if rendered is not None:
+            await ctx.send(file=discord.File(BytesIO(rendered), filename="remixed.gif"))
+            return
+
         try:
-            remixed_buffer = overlay_text_on_gif(gif_data, font, overlay_text)
+            remixed_buffer = await self.pool.run(overlay_text_on_gif, gif_data, font, overlay_text)
+        except QueueFullError:
+            await ctx.send("The remix queue is full, try again in a moment.")
+            return
+        except asyncio.TimeoutError:
+            await ctx.send("Processing the GIF took too long.")
+            return
         except Exception as e:
             await ctx.send(f"Error processing GIF: {e}")
             return
 
+        await self.cache_put(render_key, remixed_buffer.getvalue())
         await ctx.send(file=discord.File(remixed_buffer, filename="remixed.gif"))
 
+    @commands.command(name="remixcache")
+    @commands.is_owner()
+    async def remix_cache_stats(self, ctx):
+        """Shows hit/miss counts and sizes for the remix cache."""
+        stats = self.cache.stats()
+        await ctx.send("\n".join(f"{key}: {value}" for key, value in stats.items()))
+
+    @commands.command(name="fonts")
+    async def list_fonts(self, ctx):
+        """Lists the fonts available to remix."""
+        fonts = font_registry()
+        if not fonts:
+            await ctx.send("No fonts are installed, remix uses the built-in font for any font name.")
+            return
+        await ctx.send("Available fonts: " + ", ".join(f"`{name}`" for name in fonts))
+
 async def setup(bot):
     await bot.add_cog(RemixCog(bot))
@@ -1,44 +1,117 @@
 import os
+import re
+import shutil
+import asyncio
+import tempfile
 import discord
 from discord.ext import commands
-import yt_dlp
+from utils.downloads import DownloadManager, UserLimitError, JobCancelled
+from utils.worker_pool import QueueFullError
+from utils.cache import TwoTierCache
+from utils.audio_packer import AudioPacker, pack
+
+DOWNLOAD_DIR = "downloads"
+AUDIO_QUALITY = "192"  # mp3 bitrate in kbps
+AUDIO_CACHE_DIR = "cache/audio"
+AUDIO_CACHE_MEMORY = 1024 * 1024  # Only titles are read into memory; the audio is sent from disk
+AUDIO_CACHE_DISK = 5 * 1024 * 1024 * 1024  # Bytes of finished audio kept on disk
 
 class Y2MP3Cog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.cache = TwoTierCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MEMORY, AUDIO_CACHE_DISK)
+        self.downloads = DownloadManager(DOWNLOAD_DIR, cache=self.cache)
+        self.packer = AudioPacker()
+
+    def cog_unload(self):
+        self.downloads.shutdown()
+        self.packer.shutdown()
 
     @commands.command(name="y2mp3")
     async def download_audio(self, ctx, url: str):
-        """Downloads audio from a YouTube link and sends it back."""
-        await ctx.send("Downloading audio... Please wait.")
-        
-        output_dir = "downloads"
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': f'{output_dir}/%(title)s.%(ext)s',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-        }
-        
+        """
+        Downloads audio from a YouTube link and sends it back.
+        Downloads are queued; the status message is updated as the job progresses.
+        Audio over the upload limit is re-encoded to fit or split into parts.
+        """
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                file_name = f"{output_dir}/{info['title']}.mp3"
-        
-            if os.path.exists(file_name):
-                await ctx.send("Download complete! Here's your audio:", file=discord.File(file_name))
-                os.remove(file_name)  # Cleanup after sending
-            else:
-                await ctx.send("Failed to process the audio file.")
-        
+            job = self.downloads.submit(ctx.author.id, url)
+        except (QueueFullError, UserLimitError) as e:
+            await ctx.send(str(e))
+            return
+        status = await ctx.send(f"{job.describe()}. Use `y2mp3cancel {job.id}` to cancel.")
+
+        async def report(job):
+            try:
+                await status.edit(content=job.describe())
+            except discord.HTTPException:
+                pass
+
+        try:
+            result = await self.downloads.fetch(job, AUDIO_QUALITY, report)
+        except JobCancelled:
+            await report(job)
+            return
         except Exception as e:
-            await ctx.send(f"Error: {e}")
+            await status.edit(content=f"Job #{job.id} failed: {e}")
+            return
+
+        file_name = result["path"]
+        # Re-encoded or split copies go in a private directory; the source may be a shared cache entry.
+        work_dir = tempfile.mkdtemp(dir=DOWNLOAD_DIR)
+        try:
+            if not os.path.exists(file_name):
+                await status.edit(content=f"Job #{job.id}: failed to process the audio file.")
+                return
+            await status.edit(content=f"Job #{job.id}: uploading")
+            title = re.sub(r'[\\/:*?"<>|]', "_", result["title"])
+            parts = await self.packer.prepare(file_name, work_dir, title)
+            for i, group in enumerate(pack(parts)):
+                await ctx.send(
+                    "Download complete! Here's your audio:" if i == 0 else None,
+                    files=[
+                        discord.File(path, filename=f"{title}.mp3" if path == file_name else os.path.basename(path))
+                        for path in group
+                    ],
+                )
+            await status.edit(content=f"Job #{job.id}: done")
+        except asyncio.TimeoutError:
+            await status.edit(content=f"Job #{job.id}: shrinking the audio to fit the upload limit took too long.")
+        except Exception as e:
+            await status.edit(content=f"Job #{job.id}: upload failed: {e}")
+        finally:
+            if not result["cached"] and os.path.exists(file_name):
+                os.remove(file_name)  # Cleanup after sending
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @commands.command(name="y2mp3cancel")
+    async def cancel_download(self, ctx, job_id: int):
+        """Cancels one of your queued or running downloads. Moderators can cancel any job."""
+        permissions = getattr(ctx.author, "guild_permissions", None)
+        owner_only = None if permissions and permissions.manage_messages else ctx.author.id
+        if self.downloads.cancel(job_id, owner_only):
+            await ctx.send(f"Cancelled job #{job_id}.")
+        else:
+            await ctx.send(f"No download #{job_id} of yours is queued or running.")
+
+    @commands.command(name="y2mp3queue")
+    async def download_queue(self, ctx):
+        """Lists queued and running downloads."""
+        jobs = list(self.downloads.jobs.values())
+        if not jobs:
+            await ctx.send("The download queue is empty.")
+            return
+        await ctx.send(
+            "\n".join(f"{job.describe()} (<@{job.user_id}>)" for job in jobs),
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    @commands.command(name="y2mp3cache")
+    @commands.is_owner()
+    async def audio_cache_stats(self, ctx):
+        """Shows hit/miss counts and sizes for the downloaded audio cache."""
+        stats = self.cache.stats()
+        await ctx.send("\n".join(f"{key}: {value}" for key, value in stats.items()))
 
 async def setup(bot):
     await bot.add_cog(Y2MP3Cog(bot))
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import tempfile
+
+LOUDNESS_TARGET = -16  # Integrated loudness in LUFS used when normalizing
+SAMPLE_RATE = 24000  # gTTS output rate; every clip is resampled to it before joining
+
+def strip_tags(clip: bytes) -> bytes:
+    """Returns just the MPEG audio frames of an MP3, without ID3v2/ID3v1 tags."""
+    if clip[:3] == b"ID3" and len(clip) >= 10:
+        size = (clip[6] << 21) | (clip[7] << 14) | (clip[8] << 7) | clip[9]  # Syncsafe integer
+        footer = 10 if clip[5] & 0x10 else 0
+        clip = clip[10 + size + footer:]
+    if len(clip) >= 128 and clip[-128:-125] == b"TAG":
+        clip = clip[:-128]
+    return clip
+
+def concat_frames(clips: list) -> bytes:
+    """
+    Joins MP3 clips at the frame level, without decoding. MP3 frames are
+    self-contained, so clips encoded with the same settings (as gTTS clips
+    are) form one valid stream when their frames are laid end to end.
+    """
+    return b"".join(strip_tags(clip) for clip in clips)
+
+def merge_clips(clips: list, gap_ms: int = 0, normalize: bool = False) -> bytes:
+    """
+    Concatenates MP3 clips into one MP3 in a single pass. Without gaps or
+    normalization this is a frame-level join with no subprocess at all;
+    otherwise one ffmpeg process pads each clip with silence, joins them with
+    the concat filter and applies loudness normalization to the result.
+    """
+    if not clips:
+        return b""
+    if not gap_ms and not normalize:
+        return concat_frames(clips)
+    with tempfile.TemporaryDirectory() as work_dir:
+        cmd = ["ffmpeg", "-v", "error"]
+        for i, clip in enumerate(clips):
+            path = os.path.join(work_dir, f"{i}.mp3")
+            with open(path, "wb") as f:
+                f.write(clip)
+            cmd += ["-i", path]
+        chains = []
+        for i in range(len(clips)):
+            chain = f"[{i}:a]aformat=sample_rates={SAMPLE_RATE}:channel_layouts=mono"
+            if gap_ms and i < len(clips) - 1:
+                chain += f",apad=pad_dur={gap_ms / 1000:.3f}"
+            chains.append(chain + f"[a{i}]")
+        graph = ";".join(chains) + ";" + "".join(f"[a{i}]" for i in range(len(clips)))
+        graph += f"concat=n={len(clips)}:v=0:a=1"
+        if normalize:
+            graph += f",loudnorm=I={LOUDNESS_TARGET},aresample={SAMPLE_RATE}"
+        cmd += ["-filter_complex", graph + "[out]", "-map", "[out]", "-c:a", "libmp3lame", "-q:a", "4", "-f", "mp3", "pipe:1"]
+        return subprocess.run(cmd, capture_output=True, check=True).stdout
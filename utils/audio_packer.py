@@ -0,0 +1,97 @@
+import math
+import os
+import subprocess
+from utils.worker_pool import WorkerPool
+
+MAX_MESSAGE_BYTES = 25 * 1024 * 1024  # Discord's upload limit per message for free users
+MAX_ATTACHMENTS = 10  # Files Discord accepts in one message
+FIT_MARGIN = 0.95  # Share of the limit an encode aims for, leaving room for tags and bitrate drift
+MIN_BITRATE = 64  # kbps; tracks that would need less than this are split instead
+MAX_BITRATE = 320
+MP3_BITRATES = (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)  # kbps allowed for MPEG-1 Layer III
+SPLIT_BITRATE = 128  # kbps used for the parts of a split track
+PACKER_WORKERS = 1  # Worker processes re-encoding oversized tracks
+PACKER_MAX_PENDING = 20
+PACKER_TIMEOUT = 600  # Seconds allowed to fit one track
+
+def probe_duration(path: str) -> float:
+    """Returns the duration of an audio file in seconds, using ffprobe."""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip())
+
+def encode_mp3(source: str, target: str, bitrate: int, start: float = None, duration: float = None):
+    """Re-encodes the first audio stream of source to an mp3 at bitrate kbps, optionally cutting a section."""
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    if start is not None:
+        cmd += ["-ss", f"{start:.3f}", "-t", f"{duration:.3f}"]
+    # Cover art is dropped; it only eats into the size budget.
+    cmd += ["-i", source, "-map", "0:a:0", "-map_metadata", "0", "-c:a", "libmp3lame", "-b:a", f"{bitrate}k", target]
+    subprocess.run(cmd, capture_output=True, check=True)
+
+def fit_audio(path: str, max_bytes: int, output_dir: str, name: str) -> list:
+    """
+    Makes an audio file fit under max_bytes. Runs in a worker process.
+    Re-encodes it at the highest bitrate that fits, or splits it into parts
+    when that bitrate would be below MIN_BITRATE. Outputs are mp3s written
+    to output_dir and named after name; their paths are returned in order.
+    """
+    duration = probe_duration(path)
+    budget_bits = max_bytes * 8 * FIT_MARGIN
+    # LAME rounds other CBR rates to the nearest valid one, which can be higher, so round down here.
+    target_bitrate = min(MAX_BITRATE, budget_bits / duration / 1000)
+    bitrate = max((b for b in MP3_BITRATES if b <= target_bitrate), default=0)
+    if bitrate >= MIN_BITRATE:
+        target = os.path.join(output_dir, f"{name} ({bitrate}kbps).mp3")
+        encode_mp3(path, target, bitrate)
+        if os.path.getsize(target) <= max_bytes:
+            return [target]
+        os.remove(target)
+    parts = math.ceil(duration * SPLIT_BITRATE * 1000 / budget_bits)
+    section = duration / parts
+    targets = []
+    for i in range(parts):
+        target = os.path.join(output_dir, f"{name} (part {i + 1} of {parts}).mp3")
+        encode_mp3(path, target, SPLIT_BITRATE, start=i * section, duration=section)
+        targets.append(target)
+    return targets
+
+def pack(paths: list, max_bytes: int = MAX_MESSAGE_BYTES, max_files: int = MAX_ATTACHMENTS) -> list:
+    """
+    Groups files, in order, into messages of at most max_files attachments
+    and max_bytes in total. Each file must already fit under max_bytes.
+    """
+    groups = []
+    group, group_bytes = [], 0
+    for path in paths:
+        size = os.path.getsize(path)
+        if group and (len(group) == max_files or group_bytes + size > max_bytes):
+            groups.append(group)
+            group, group_bytes = [], 0
+        group.append(path)
+        group_bytes += size
+    if group:
+        groups.append(group)
+    return groups
+
+class AudioPacker:
+    """Fits oversized audio files under the upload limit in a worker process."""
+    def __init__(self, max_bytes: int = MAX_MESSAGE_BYTES):
+        self.max_bytes = max_bytes
+        self.pool = WorkerPool(PACKER_WORKERS, PACKER_MAX_PENDING, PACKER_TIMEOUT)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    async def prepare(self, path: str, output_dir: str, name: str = None) -> list:
+        """
+        Returns paths that together hold the audio at path, each small enough to upload:
+        [path] itself when it already fits, otherwise the outputs of fit_audio.
+        """
+        if os.path.getsize(path) <= self.max_bytes:
+            return [path]
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        return await self.pool.run(fit_audio, path, self.max_bytes, output_dir, name)
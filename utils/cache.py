@@ -0,0 +1,165 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def cache_key(*parts) -> str:
+    """Builds a fixed-length key from any number of string-able parts."""
+    return hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+class TwoTierCache:
+    """
+    Byte-value cache with an in-memory LRU in front of a directory on disk.
+    Both tiers are bounded by total size and evict least recently used
+    entries first. Safe to call from worker threads.
+    """
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_used = 0
+        self.disk = OrderedDict()  # key -> size, least recently used first
+        self.disk_used = 0
+        self.lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.disk[name] = size
+            self.disk_used += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _remember(self, key: str, value: bytes):
+        if len(value) > self.memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_used -= len(self.memory.pop(key))
+        self.memory[key] = value
+        self.memory_used += len(value)
+        while self.memory_used > self.memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_used -= len(evicted)
+
+    def get(self, key: str):
+        """Returns the cached bytes for key, or None."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return self.memory[key]
+            if key not in self.disk:
+                self.misses += 1
+                return None
+            self.disk.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                value = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            with self.lock:
+                self.disk_used -= self.disk.pop(key, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits["disk"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: bytes):
+        """Stores value in both tiers, evicting old entries to stay in budget."""
+        if len(value) <= self.disk_bytes:
+            # A unique temp file per write, so concurrent puts of one key never share it.
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(value)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        with self.lock:
+            self._remember(key, value)
+            if len(value) > self.disk_bytes:
+                return
+            evicted = self._track_disk(key, len(value))
+        self._remove(evicted)
+
+    def get_path(self, key: str):
+        """Returns the path of key's file in the disk tier, or None. Counts as a use for LRU."""
+        with self.lock:
+            if key not in self.disk:
+                self.misses += 1
+                return None
+            self.disk.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            with self.lock:
+                self.disk_used -= self.disk.pop(key, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits["disk"] += 1
+        return self._path(key)
+
+    def put_file(self, key: str, source: str):
+        """
+        Moves the file at source into the disk tier without reading it into memory.
+        Returns its new path, or None (leaving source in place) if it exceeds the disk budget.
+        """
+        size = os.path.getsize(source)
+        if size > self.disk_bytes:
+            return None
+        shutil.move(source, self._path(key))
+        with self.lock:
+            evicted = self._track_disk(key, size)
+        self._remove(evicted)
+        return self._path(key)
+
+    def _track_disk(self, key: str, size: int) -> list:
+        """Records key as the most recent disk entry and returns the keys evicted to make room. Call with lock held."""
+        self.disk_used -= self.disk.pop(key, 0)
+        self.disk[key] = size
+        self.disk_used += size
+        evicted = []
+        while self.disk_used > self.disk_bytes:
+            old_key, old_size = self.disk.popitem(last=False)
+            self.disk_used -= old_size
+            evicted.append(old_key)
+        return evicted
+
+    def _remove(self, keys: list):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_used,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk_used,
+            }
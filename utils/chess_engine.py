@@ -0,0 +1,243 @@
+import time
+import chess
+import chess.polyglot
+
+MAX_DEPTH = 32
+MATE_SCORE = 100000
+INFINITY = 1000000
+TIME_CHECK_NODES = 1024  # Nodes searched between clock checks
+EXACT, LOWER, UPPER = 0, 1, 2  # Transposition table bound types
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+# Piece-square tables from White's point of view, written rank 8 first
+# (so the entry for a White piece on square s is at index s ^ 56).
+PIECE_SQUARE_TABLES = {
+    chess.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    chess.KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    chess.BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    chess.ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    chess.QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    chess.KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+
+# Value of each (piece, square) pair, folded together once at import.
+_SQUARE_VALUES = {
+    (piece_type, color): [
+        PIECE_VALUES[piece_type] + PIECE_SQUARE_TABLES[piece_type][square ^ 56 if color == chess.WHITE else square]
+        for square in chess.SQUARES
+    ]
+    for piece_type in chess.PIECE_TYPES for color in chess.COLORS
+}
+
+BENCHMARK_POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out."""
+
+def evaluate(board: chess.Board) -> int:
+    """Material plus piece-square score, from the side to move's point of view."""
+    score = 0
+    for square, piece in board.piece_map().items():
+        value = _SQUARE_VALUES[piece.piece_type, piece.color][square]
+        score += value if piece.color == chess.WHITE else -value
+    return score if board.turn == chess.WHITE else -score
+
+class Searcher:
+    """
+    Negamax alpha-beta with a quiescence search, a transposition table keyed
+    by Zobrist hash, and move ordering (hash move, MVV-LVA captures,
+    promotions, killer moves). Driven by iterative deepening in search().
+    """
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.nodes = 0
+        self.table = {}  # Zobrist hash -> (depth, score, bound, best move)
+        self.killers = {}  # ply -> quiet moves that caused a cutoff there
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0 and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+
+    def _capture_score(self, board: chess.Board, move: chess.Move) -> int:
+        victim = board.piece_type_at(move.to_square) or chess.PAWN  # En passant captures a pawn
+        return 10 * PIECE_VALUES.get(victim, 0) - board.piece_type_at(move.from_square)
+
+    def ordered_moves(self, board: chess.Board, hash_move, ply: int) -> list:
+        killers = self.killers.get(ply, ())
+
+        def priority(move):
+            if move == hash_move:
+                return 3000000
+            if board.is_capture(move):
+                return 2000000 + self._capture_score(board, move)
+            if move.promotion:
+                return 1500000
+            if move in killers:
+                return 1000000
+            return 0
+        return sorted(board.legal_moves, key=priority, reverse=True)
+
+    def quiesce(self, board: chess.Board, alpha: int, beta: int) -> int:
+        """Searches captures only, so the static evaluation is never taken mid-exchange."""
+        self._tick()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        captures = sorted(board.generate_legal_captures(), key=lambda m: self._capture_score(board, m), reverse=True)
+        for move in captures:
+            board.push(move)
+            score = -self.quiesce(board, -beta, -alpha)
+            board.pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def negamax(self, board: chess.Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._tick()
+        if ply and (board.is_repetition(2) or board.halfmove_clock >= 100 or board.is_insufficient_material()):
+            return 0
+        key = chess.polyglot.zobrist_hash(board)
+        entry = self.table.get(key)
+        hash_move = None
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move = entry
+            if ply and entry_depth >= depth and (
+                bound == EXACT
+                or (bound == LOWER and entry_score >= beta)
+                or (bound == UPPER and entry_score <= alpha)
+            ):
+                return entry_score
+        if depth <= 0:
+            return self.quiesce(board, alpha, beta)
+        moves = self.ordered_moves(board, hash_move, ply)
+        if not moves:
+            return -MATE_SCORE + ply if board.is_check() else 0
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        for move in moves:
+            quiet = not board.is_capture(move)
+            board.push(move)
+            score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                if quiet:
+                    killers = self.killers.setdefault(ply, [])
+                    if move not in killers:
+                        killers.insert(0, move)
+                        del killers[2:]
+                break
+        bound = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        self.table[key] = (depth, best_score, bound, best_move)
+        return best_score
+
+def search(board: chess.Board, time_limit: float, max_depth: int = MAX_DEPTH) -> dict:
+    """
+    Iteratively deepens until time_limit seconds have passed (or a mate is
+    found) and returns the best move of the deepest completed iteration:
+    {"move": uci, "depth", "nodes", "score" (centipawns, side to move), "seconds"}.
+    """
+    start = time.monotonic()
+    searcher = Searcher(start + time_limit)
+    best_move, completed, score = None, 0, 0
+    root_key = chess.polyglot.zobrist_hash(board)
+    for depth in range(1, max_depth + 1):
+        try:
+            depth_score = searcher.negamax(board, depth, -INFINITY, INFINITY, 0)
+        except SearchTimeout:
+            break
+        score, completed = depth_score, depth
+        best_move = searcher.table[root_key][3]
+        if abs(score) >= MATE_SCORE - MAX_DEPTH:
+            break
+    if best_move is None:
+        best_move = next(iter(board.legal_moves))
+    return {
+        "move": best_move.uci(),
+        "depth": completed,
+        "nodes": searcher.nodes,
+        "score": score,
+        "seconds": time.monotonic() - start,
+    }
+
+def best_move(start_fen: str, moves: list, time_limit: float) -> dict:
+    """Replays a game and searches its current position. Runs in a worker process."""
+    board = chess.Board(start_fen)
+    for move in moves:
+        board.push(chess.Move.from_uci(move))
+    return search(board, time_limit)
+
+def benchmark(seconds_per_position: float) -> dict:
+    """Searches each of BENCHMARK_POSITIONS for a fixed time and reports the combined node rate."""
+    nodes, elapsed, depths = 0, 0.0, []
+    for fen in BENCHMARK_POSITIONS:
+        result = search(chess.Board(fen), seconds_per_position)
+        nodes += result["nodes"]
+        elapsed += result["seconds"]
+        depths.append(result["depth"])
+    return {"nodes": nodes, "seconds": elapsed, "nps": int(nodes / elapsed) if elapsed else 0, "depths": depths}
@@ -0,0 +1,131 @@
+import sqlite3
+import time
+import chess
+
+CHESS_DB_FILE = "chess_games.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    channel_id INTEGER NOT NULL,
+    white_id INTEGER NOT NULL,
+    black_id INTEGER NOT NULL,
+    start_fen TEXT NOT NULL,
+    moves TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (channel_id, white_id, black_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS games_updated_at ON games (updated_at);
+"""
+
+class ChessGame:
+    """A game as its starting FEN plus the UCI moves played since."""
+    __slots__ = ("channel_id", "white_id", "black_id", "start_fen", "moves", "updated_at")
+
+    def __init__(self, channel_id: int, white_id: int, black_id: int,
+                 start_fen: str = chess.STARTING_FEN, moves: list = None, updated_at: float = None):
+        self.channel_id = channel_id
+        self.white_id = white_id
+        self.black_id = black_id
+        self.start_fen = start_fen
+        self.moves = moves if moves is not None else []
+        self.updated_at = updated_at if updated_at is not None else time.time()
+
+    @property
+    def key(self) -> tuple:
+        return (self.channel_id, self.white_id, self.black_id)
+
+    def board(self) -> chess.Board:
+        """Replays the game, so the board has its full history (needed for repetition rules)."""
+        board = chess.Board(self.start_fen)
+        for move in self.moves:
+            board.push(chess.Move.from_uci(move))
+        return board
+
+    def player_to_move(self, board: chess.Board) -> int:
+        return self.white_id if board.turn == chess.WHITE else self.black_id
+
+class GameRegistry:
+    """
+    Every game in progress, keyed by (channel or thread, white, black),
+    mirrored to SQLite. A player has at most one game per channel, so a
+    player's game is found from the channel they type in. Each move is
+    written as a single-row append. The engine (engine_id) is not a player
+    for that rule: its games are indexed by their human player only, so it
+    can play any number of games in a channel.
+    """
+    def __init__(self, path: str = CHESS_DB_FILE, engine_id: int = None):
+        self.engine_id = engine_id
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.games = {}  # key -> ChessGame
+        self.by_player = {}  # (channel id, user id) -> ChessGame
+        for channel_id, white_id, black_id, start_fen, moves, updated_at in self.conn.execute("SELECT * FROM games"):
+            self._index(ChessGame(channel_id, white_id, black_id, start_fen, moves.split(), updated_at))
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def set_engine(self, engine_id: int):
+        """Sets the user ID the engine plays as (known once the bot has logged in) and reindexes."""
+        self.engine_id = engine_id
+        self.by_player = {}
+        for game in self.games.values():
+            self._index(game)
+
+    def _humans(self, *player_ids) -> list:
+        return [player_id for player_id in player_ids if player_id != self.engine_id]
+
+    def _index(self, game: ChessGame):
+        self.games[game.key] = game
+        for player_id in self._humans(game.white_id, game.black_id):
+            self.by_player[(game.channel_id, player_id)] = game
+
+    def find(self, channel_id: int, user_id: int):
+        """Returns the user's game in this channel, or None."""
+        return self.by_player.get((channel_id, user_id))
+
+    def start(self, channel_id: int, white_id: int, black_id: int) -> ChessGame:
+        """Registers a new game. Either human player already having a game in the channel raises ValueError."""
+        if any(self.find(channel_id, player_id) for player_id in self._humans(white_id, black_id)):
+            raise ValueError("A player already has a game in progress in this channel.")
+        game = ChessGame(channel_id, white_id, black_id)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, '', ?)",
+            (channel_id, white_id, black_id, game.start_fen, game.updated_at),
+        )
+        self.conn.commit()
+        self._index(game)
+        return game
+
+    def record_move(self, game: ChessGame, move: chess.Move):
+        game.moves.append(move.uci())
+        game.updated_at = time.time()
+        self.conn.execute(
+            "UPDATE games SET moves = moves || ?, updated_at = ? WHERE channel_id = ? AND white_id = ? AND black_id = ?",
+            (" " + move.uci(), game.updated_at, *game.key),
+        )
+        self.conn.commit()
+
+    def finish(self, game: ChessGame):
+        """Removes a game that ended or was abandoned."""
+        self.games.pop(game.key, None)
+        for player_id in (game.white_id, game.black_id):
+            if self.by_player.get((game.channel_id, player_id)) is game:
+                del self.by_player[(game.channel_id, player_id)]
+        self.conn.execute(
+            "DELETE FROM games WHERE channel_id = ? AND white_id = ? AND black_id = ?", game.key
+        )
+        self.conn.commit()
+
+    def expire(self, max_idle: float) -> list:
+        """Removes and returns games with no move for max_idle seconds."""
+        cutoff = time.time() - max_idle
+        expired = [game for game in self.games.values() if game.updated_at < cutoff]
+        for game in expired:
+            self.finish(game)
+        return expired
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+import chess
+import chess.svg
+import cairosvg
+from PIL import Image, ImageDraw, ImageFont
+
+SQUARE_SIZE = 60  # Pixels per square
+MARGIN = 20  # Border holding the file and rank labels
+LIGHT_SQUARE = "#ffce9e"  # Same colours as chess.svg
+DARK_SQUARE = "#d18b47"
+BORDER = "#212121"
+LABEL = "#e5e5e5"
+RENDER_CACHE_SIZE = 512  # Rendered positions kept in memory
+
+def rasterize_piece(piece: chess.Piece, size: int) -> Image.Image:
+    """Renders one chess.svg piece sprite to an RGBA image of size x size pixels."""
+    png = cairosvg.svg2png(bytestring=chess.svg.piece(piece).encode("utf-8"), output_width=size, output_height=size)
+    return Image.open(BytesIO(png)).convert("RGBA")
+
+class BoardRenderer:
+    """
+    Draws boards by pasting pre-rasterized piece sprites onto a pre-drawn
+    empty board, instead of rasterizing an SVG per position. Encoded PNGs
+    are kept in an LRU keyed by (piece placement, orientation).
+    """
+    def __init__(self, square_size: int = SQUARE_SIZE, cache_size: int = RENDER_CACHE_SIZE):
+        self.square_size = square_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.sprites = {
+            piece: rasterize_piece(piece, square_size)
+            for piece in (chess.Piece(piece_type, color) for color in chess.COLORS for piece_type in chess.PIECE_TYPES)
+        }
+        self.boards = {orientation: self._draw_empty_board(orientation) for orientation in chess.COLORS}
+
+    def _draw_empty_board(self, orientation: chess.Color) -> Image.Image:
+        size = 8 * self.square_size + 2 * MARGIN
+        image = Image.new("RGB", (size, size), BORDER)
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default()
+        for square in chess.SQUARES:
+            x, y = self._origin(square, orientation)
+            color = LIGHT_SQUARE if (chess.square_file(square) + chess.square_rank(square)) % 2 else DARK_SQUARE
+            draw.rectangle([x, y, x + self.square_size - 1, y + self.square_size - 1], fill=color)
+        for index in range(8):
+            file_name = chess.FILE_NAMES[index if orientation == chess.WHITE else 7 - index]
+            rank_name = chess.RANK_NAMES[7 - index if orientation == chess.WHITE else index]
+            center = MARGIN + index * self.square_size + self.square_size // 2
+            for x, y, text in ((center, MARGIN // 2, file_name), (center, size - MARGIN // 2, file_name),
+                               (MARGIN // 2, center, rank_name), (size - MARGIN // 2, center, rank_name)):
+                draw.text((x, y), text, fill=LABEL, font=font, anchor="mm")
+        return image
+
+    def _origin(self, square: chess.Square, orientation: chess.Color) -> tuple:
+        """Top-left pixel of a square as seen from orientation's side."""
+        file, rank = chess.square_file(square), chess.square_rank(square)
+        column, row = (file, 7 - rank) if orientation == chess.WHITE else (7 - file, rank)
+        return MARGIN + column * self.square_size, MARGIN + row * self.square_size
+
+    def render_png(self, board: chess.Board, orientation: chess.Color = chess.WHITE) -> bytes:
+        """Returns the position as PNG bytes, from the cache when it was drawn before."""
+        key = (board.board_fen(), orientation)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        image = self.boards[orientation].copy()
+        for square, piece in board.piece_map().items():
+            sprite = self.sprites[piece]
+            image.paste(sprite, self._origin(square, orientation), sprite)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", compress_level=1)
+        png = buffer.getvalue()
+        with self.lock:
+            self.cache[key] = png
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return png
+
+    def render(self, board: chess.Board, orientation: chess.Color = chess.WHITE) -> BytesIO:
+        """Like render_png, but returns a buffer ready for discord.File."""
+        return BytesIO(self.render_png(board, orientation))
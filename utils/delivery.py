@@ -0,0 +1,51 @@
+import asyncio
+import discord
+
+DELIVERY_WORKERS = 5  # Messages in flight at once
+MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2  # Seconds; doubled on every retry
+
+class DeliveryQueue:
+    """
+    Sends messages to many recipients with a fixed number of workers.
+    Failed sends are re-queued after the rate-limit retry_after or an
+    exponential backoff, so a large fan-out never blocks its caller.
+    """
+    def __init__(self, workers: int = DELIVERY_WORKERS):
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(workers)]
+        self.sent = 0
+        self.failed = 0
+
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def enqueue(self, destination, content: str, attempt: int = 1):
+        """Queues content for a discord.abc.Messageable (user, member or channel)."""
+        self.queue.put_nowait((destination, content, attempt))
+
+    def retry_later(self, destination, content: str, attempt: int, delay: float):
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, self.enqueue, destination, content, attempt + 1)
+
+    async def worker(self):
+        while True:
+            destination, content, attempt = await self.queue.get()
+            try:
+                await destination.send(content)
+                self.sent += 1
+            except discord.Forbidden:
+                self.failed += 1  # DMs closed or missing permissions; retrying will not help.
+            except discord.HTTPException as e:
+                if attempt >= MAX_ATTEMPTS:
+                    self.failed += 1
+                    print(f"Giving up on delivery to {destination}: {e}")
+                else:
+                    delay = getattr(e, "retry_after", None) or RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                    self.retry_later(destination, content, attempt, delay)
+            except Exception as e:
+                self.failed += 1
+                print(f"Error delivering to {destination}: {e}")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,235 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from utils.worker_pool import QueueFullError
+from utils.cache import cache_key
+
+DOWNLOAD_WORKERS = 2  # Worker processes running yt-dlp and FFmpeg
+MAX_QUEUED_JOBS = 20  # Jobs waiting or running before new requests are refused
+MAX_JOBS_PER_USER = 2
+PROGRESS_INTERVAL = 2  # Seconds between status message edits
+
+class UserLimitError(Exception):
+    """Raised when a user already has the maximum number of jobs queued."""
+
+class JobCancelled(Exception):
+    """Raised when a job is cancelled before it finishes."""
+
+def media_key(url: str):
+    """
+    Returns "<extractor>:<video id>" for url without any network access,
+    or None when no specific extractor recognises it.
+    """
+    from yt_dlp.extractor import gen_extractor_classes
+    for extractor in gen_extractor_classes():
+        if extractor.suitable(url):
+            if extractor.ie_key() == "Generic":
+                return None
+            video_id = extractor.get_temp_id(url)
+            return f"{extractor.ie_key()}:{video_id}" if video_id else None
+    return None
+
+def download_audio(url: str, output_dir: str, quality: str, progress, cancel_event) -> dict:
+    """
+    Downloads url with yt-dlp and converts it to mp3. Runs in a worker process.
+    Progress dicts are put on the progress queue; setting cancel_event aborts the download.
+    Returns {"id", "title", "path"}.
+    """
+    import yt_dlp
+
+    partial_files = set()
+
+    def hook(status):
+        if status.get("tmpfilename"):
+            partial_files.add(status["tmpfilename"])
+        if cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled("Cancelled by user")
+        progress.put({
+            "status": status.get("status"),
+            "downloaded": status.get("downloaded_bytes") or 0,
+            "total": status.get("total_bytes") or status.get("total_bytes_estimate") or 0,
+        })
+
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        # Named by video ID so concurrent jobs never collide on titles.
+        'outtmpl': f'{output_dir}/%(id)s-{quality}.%(ext)s',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': quality,
+        }],
+        'progress_hooks': [hook],
+        'quiet': True,
+        'noprogress': True,
+    }
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+    except yt_dlp.utils.DownloadCancelled:
+        for path in partial_files:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return {"id": info["id"], "title": info.get("title", info["id"]), "path": f"{output_dir}/{info['id']}-{quality}.mp3"}
+
+class DownloadJob:
+    def __init__(self, job_id: int, user_id: int, url: str, manager):
+        self.id = job_id
+        self.user_id = user_id
+        self.url = url
+        self.status = "queued"
+        self.downloaded = 0
+        self.total = 0
+        self.progress = manager.Queue()
+        self.cancel_event = manager.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def describe(self) -> str:
+        if self.status == "downloading" and self.total:
+            return f"Job #{self.id}: downloading {self.downloaded / self.total:.0%} of {self.total / 1048576:.1f} MB"
+        return f"Job #{self.id}: {self.status}"
+
+class DownloadManager:
+    """
+    Runs downloads in a process pool with global and per-user limits.
+    Jobs wait for a free worker in submission order; each one reports
+    progress through a callback and can be cancelled while queued or running.
+    With a cache, finished audio is kept by (video id, quality) and
+    concurrent jobs for the same video share one download.
+    """
+    def __init__(self, output_dir: str, workers: int = DOWNLOAD_WORKERS, cache=None):
+        self.output_dir = output_dir
+        self.cache = cache  # TwoTierCache holding finished audio files and their titles
+        self.in_flight = {}  # cache key -> task downloading it
+        os.makedirs(output_dir, exist_ok=True)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.sync_manager = multiprocessing.Manager()
+        self.slots = asyncio.Semaphore(workers)
+        self.jobs = {}  # job id -> DownloadJob, for queued and running jobs
+        self.ids = itertools.count(1)
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.sync_manager.shutdown()
+
+    def submit(self, user_id: int, url: str) -> DownloadJob:
+        """Registers a job, enforcing the queue and per-user limits."""
+        if len(self.jobs) >= MAX_QUEUED_JOBS:
+            raise QueueFullError("The download queue is full.")
+        if sum(1 for job in self.jobs.values() if job.user_id == user_id) >= MAX_JOBS_PER_USER:
+            raise UserLimitError(f"You can have at most {MAX_JOBS_PER_USER} downloads queued.")
+        job = DownloadJob(next(self.ids), user_id, url, self.sync_manager)
+        self.jobs[job.id] = job
+        return job
+
+    def cancel(self, job_id: int, user_id: int = None) -> bool:
+        """Cancels a job; with user_id given, only that user's job. Returns True if found."""
+        job = self.jobs.get(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return False
+        job.status = "cancelled"
+        job.cancel_event.set()
+        return True
+
+    def drain_progress(self, job: DownloadJob):
+        while True:
+            try:
+                update = job.progress.get_nowait()
+            except queue.Empty:
+                return
+            if update["status"] == "finished":
+                job.status = "converting"
+            else:
+                job.downloaded, job.total = update["downloaded"], update["total"]
+
+    async def run(self, job: DownloadJob, quality: str, report) -> dict:
+        """
+        Waits for a worker, downloads the job and returns its result dict.
+        await report(job) is called whenever the job's progress changes.
+        Raises JobCancelled if the job is cancelled.
+        """
+        try:
+            async with self.slots:
+                if job.cancelled:
+                    raise JobCancelled()
+                job.status = "downloading"
+                await report(job)
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(
+                    self.executor, download_audio, job.url, self.output_dir, quality, job.progress, job.cancel_event
+                )
+                last_report = time.monotonic()
+                while not future.done():
+                    await asyncio.wait({future}, timeout=0.5)
+                    await asyncio.to_thread(self.drain_progress, job)
+                    if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.monotonic()
+                        await report(job)
+                if job.cancelled:
+                    raise JobCancelled()
+                return future.result()
+        finally:
+            self.jobs.pop(job.id, None)
+
+    async def fetch(self, job: DownloadJob, quality: str, report) -> dict:
+        """
+        Like run, but serves the audio from the cache when possible and joins
+        an identical in-flight download instead of starting another. The
+        result's "cached" flag says whether its path belongs to the cache
+        (and must not be deleted).
+        """
+        if self.cache is None:
+            return {**await self.run(job, quality, report), "cached": False}
+        media = await asyncio.to_thread(media_key, job.url)
+        if media is None:
+            return {**await self.run(job, quality, report), "cached": False}
+        key = cache_key("audio", media, quality)
+        title_key = cache_key("title", media)
+        try:
+            while True:
+                path = await asyncio.to_thread(self.cache.get_path, key)
+                if path is not None:
+                    title = await asyncio.to_thread(self.cache.get, title_key)
+                    return {"title": title.decode("utf-8") if title else media.split(":", 1)[1],
+                            "path": path, "cached": True}
+                task = self.in_flight.get(key)
+                if task is None:
+                    task = asyncio.create_task(self._download_into_cache(job, quality, report, key, title_key))
+                    self.in_flight[key] = task
+                    task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+                    return await asyncio.shield(task)
+                job.status = "waiting for an identical download"
+                await report(job)
+                try:
+                    await self._wait_unless_cancelled(job, task)
+                except JobCancelled:
+                    # The job we joined was cancelled; unless this one was too, start over.
+                    if job.cancelled:
+                        raise
+        finally:
+            self.jobs.pop(job.id, None)
+
+    async def _wait_unless_cancelled(self, job: DownloadJob, task: asyncio.Task):
+        while not task.done():
+            await asyncio.wait({task}, timeout=0.5)
+            if job.cancelled:
+                raise JobCancelled()
+        task.result()
+
+    async def _download_into_cache(self, job, quality, report, key, title_key) -> dict:
+        result = await self.run(job, quality, report)
+        await asyncio.to_thread(self.cache.put, title_key, result["title"].encode("utf-8"))
+        path = await asyncio.to_thread(self.cache.put_file, key, result["path"])
+        if path is None:
+            return {**result, "cached": False}  # Too large for the cache; the caller deletes it
+        return {**result, "path": path, "cached": True}
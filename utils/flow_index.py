@@ -0,0 +1,177 @@
+import hashlib
+import heapq
+import mmap
+import os
+import pickle
+import re
+from array import array
+from collections import Counter
+try:
+    from rapidfuzz import fuzz  # Same scorers as fuzzywuzzy, implemented in C++
+except ImportError:
+    from fuzzywuzzy import fuzz
+
+NGRAM = 3
+MAX_CANDIDATES = 100  # Lines handed to the fuzzy scorer per query
+COMMON_NGRAM_RATIO = 0.05  # N-grams found in more than this share of lines are skipped when rarer ones exist
+FINGERPRINT_BYTES = 4096  # Bytes before the old end of file that must be unchanged for an append-only update
+INDEX_VERSION = 2
+
+def normalize(text: str) -> str:
+    return " " + re.sub(r"[^0-9a-z]+", " ", text.lower()).strip() + " "
+
+def ngrams(text: str) -> set:
+    text = normalize(text)
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+class FlowIndex:
+    """
+    Character n-gram index over the non-empty lines of a text file.
+    The file itself stays memory-mapped; lines are addressed through compact
+    arrays of byte offsets and only decoded when a query scores them.
+    Queries collect candidate lines that share the most n-grams with the
+    query and only score those, so latency depends on the candidate count
+    rather than the corpus size. When the file only grew, just the new tail
+    is indexed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.starts = array("Q")  # Byte offset of each non-empty line
+        self.ends = array("Q")
+        self.postings = {}  # n-gram -> array of line numbers
+        self.indexed_size = 0  # Bytes covered by complete (newline-terminated) lines
+        self.partial_tail = False  # Whether the last indexed line had no newline yet
+        self.fingerprint = b""
+        self.mtime = None
+        self.size = None
+        self.corpus = None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def load(cls, path: str, index_path: str) -> "FlowIndex":
+        """
+        Returns the index for path, reusing the pickled index at index_path
+        (and only indexing what was appended since) when possible.
+        """
+        index = cls(path)
+        try:
+            with open(index_path, "rb") as f:
+                state = pickle.load(f)
+            if state[0] == INDEX_VERSION:
+                (_, index.starts, index.ends, index.postings, index.indexed_size,
+                 index.partial_tail, index.fingerprint, index.mtime, index.size) = state
+        except (OSError, pickle.UnpicklingError, ValueError, EOFError, IndexError):
+            pass
+        if index.is_stale():
+            index.refresh()
+            index.save(index_path)
+        else:
+            index.map_corpus()
+        return index
+
+    def save(self, index_path: str):
+        state = (INDEX_VERSION, self.starts, self.ends, self.postings, self.indexed_size,
+                 self.partial_tail, self.fingerprint, self.mtime, self.size)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+
+    def close(self):
+        if self.corpus is not None:
+            self.corpus.close()
+            self.corpus = None
+
+    def map_corpus(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self.corpus = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def is_stale(self) -> bool:
+        stat = os.stat(self.path)
+        return stat.st_mtime != self.mtime or stat.st_size != self.size
+
+    def _fingerprint(self, end: int) -> bytes:
+        return hashlib.sha1(self.corpus[max(0, end - FINGERPRINT_BYTES):end]).digest()
+
+    def _reset(self):
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.postings = {}
+        self.indexed_size = 0
+        self.partial_tail = False
+
+    def _drop_last_line(self, text: str):
+        """Removes the last indexed line; its number is the last entry of each of its posting lists."""
+        for gram in ngrams(text):
+            self.postings[gram].pop()
+            if not self.postings[gram]:
+                del self.postings[gram]
+        self.starts.pop()
+        self.ends.pop()
+
+    def refresh(self):
+        """Brings the index up to date, indexing only the appended tail when the file just grew."""
+        stat = os.stat(self.path)
+        self.map_corpus()
+        size = len(self.corpus) if self.corpus is not None else 0
+        # The fingerprint covers the end of the previously indexed file, so a match
+        # means everything indexed so far (including an unterminated last line) is intact.
+        appended = (
+            self.corpus is not None and self.size is not None and self.size <= size
+            and self._fingerprint(self.size) == self.fingerprint
+        )
+        if not appended:
+            self._reset()
+        elif self.partial_tail:
+            self._drop_last_line(self.line(len(self) - 1))
+            self.partial_tail = False
+        position = self.indexed_size
+        while position < size:
+            newline = self.corpus.find(b"\n", position)
+            end = size if newline == -1 else newline
+            text = self.corpus[position:end].decode("utf-8", errors="replace").strip()
+            if text:
+                line_no = len(self.starts)
+                self.starts.append(position)
+                self.ends.append(end)
+                for gram in ngrams(text):
+                    self.postings.setdefault(gram, array("I")).append(line_no)
+                self.partial_tail = newline == -1
+            if newline == -1:
+                break
+            position = newline + 1
+            self.indexed_size = position
+        self.fingerprint = self._fingerprint(size) if self.corpus is not None else b""
+        self.mtime = stat.st_mtime
+        self.size = size
+
+    def line(self, line_no: int) -> str:
+        return self.corpus[self.starts[line_no]:self.ends[line_no]].decode("utf-8", errors="replace").strip()
+
+    def candidates(self, query: str) -> list:
+        """Line numbers sharing the most n-grams with the query, best first."""
+        lists = sorted((self.postings[g] for g in ngrams(query) if g in self.postings), key=len)
+        if not lists:
+            return []
+        limit = max(len(self) * COMMON_NGRAM_RATIO, len(lists[0]))
+        counts = Counter()
+        for postings in lists:
+            if len(postings) > limit:
+                break
+            counts.update(postings)
+        return [line_no for line_no, _ in counts.most_common(MAX_CANDIDATES)]
+
+    def search(self, query: str, limit: int = 1) -> list:
+        """Returns up to limit (line, score) pairs, best first."""
+        # Both strings are pre-normalized the way fuzzywuzzy's full_process would,
+        # so either scorer backend ranks lines the same way.
+        query_text = normalize(query).strip()
+        scored = []
+        for line_no in self.candidates(query):
+            text = self.line(line_no)
+            scored.append((text, round(fuzz.WRatio(query_text, normalize(text).strip()))))
+        return heapq.nlargest(limit, scored, key=lambda pair: pair[1])
@@ -0,0 +1,79 @@
+import os
+from functools import lru_cache
+from PIL import ImageFont
+
+FONTS_DIR = "fonts"
+FONT_EXTENSIONS = (".ttf", ".otf")
+FONT_CACHE_SIZE = 64  # (font, size) pairs kept loaded
+REFERENCE_SIZE = 100  # Size used to measure text before scaling it to fit
+
+_registry = None
+
+def scan_fonts(directory: str = FONTS_DIR) -> dict:
+    """Maps short lowercase names (file stems) to font files in directory."""
+    fonts = {}
+    if os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() in FONT_EXTENSIONS:
+                fonts[stem.lower()] = os.path.join(directory, filename)
+    return fonts
+
+def font_registry() -> dict:
+    """Returns the registry of available fonts, scanning FONTS_DIR on first use."""
+    global _registry
+    if _registry is None:
+        _registry = scan_fonts()
+    return _registry
+
+def reload_fonts() -> dict:
+    """Rescans FONTS_DIR, drops every cached font and returns the new registry."""
+    global _registry
+    _registry = scan_fonts()
+    load_font.cache_clear()
+    return _registry
+
+def preload_fonts():
+    """
+    Loads every registered font at the size fit_font measures with, so
+    worker processes forked afterwards start with them cached.
+    """
+    for name in font_registry():
+        load_font(name, REFERENCE_SIZE)
+
+def has_font(name: str) -> bool:
+    """True if load_font accepts name. Any name is accepted while no fonts are installed."""
+    registry = font_registry()
+    return not registry or name.lower() in registry
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(name: str, size: int):
+    """
+    Returns a FreeTypeFont for a registered font name at the given size.
+    With no fonts installed, Pillow's built-in font is returned for any name.
+    Raises KeyError if the name is not registered.
+    """
+    registry = font_registry()
+    if not registry:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(registry[name.lower()], size)
+
+def fit_font(name: str, text: str, max_width: int, min_size: int = 10, max_size: int = 64):
+    """
+    Returns the largest font (between min_size and max_size) whose rendering
+    of text fits in max_width. The text is measured once at a reference size
+    and scaled, so only the chosen size needs to be loaded.
+    """
+    reference = load_font(name, REFERENCE_SIZE)
+    bbox = reference.getbbox(text)
+    width = max(bbox[2] - bbox[0], 1)
+    size = max(min_size, min(max_size, REFERENCE_SIZE * max_width // width))
+    font = load_font(name, size)
+    # Hinting makes widths scale slightly non-linearly; step down if the estimate overshoots.
+    while size > min_size:
+        bbox = font.getbbox(text)
+        if bbox[2] - bbox[0] <= max_width:
+            break
+        size -= 1
+        font = load_font(name, size)
+    return font
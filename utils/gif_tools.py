@@ -1,80 +1,378 @@
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont, ImageSequence
+import math
+import struct
+from PIL import GifImagePlugin, Image, ImageChops, ImageDraw, ImageSequence, ImageStat
+from utils.fonts import has_font, load_font, fit_font
 
-def overlay_text_on_gif(gif_data: bytes, font_path: str, overlay_text: str, font_size: int = 20, text_color: str = "black", padding: int = 10) -> BytesIO:
+PALETTE_SAMPLE_FRAMES = 16  # Leading frames buffered to build the shared palette
+PALETTE_MAX_ERROR = 6.0  # Mean per-channel error that triggers a new palette
+PALETTE_PREVIEW_SCALE = 4  # Drift checks and palette rebuilds look at 1/N-size copies
+LOOP_EXTENSION = b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00"  # Loop forever, as Pillow writes with loop=0
+MAX_FRAME_PIXELS = 640 * 640  # Larger frames are downscaled
+MAX_FRAMES = 300  # Longer GIFs have frames dropped
+MAX_OUTPUT_BYTES = 25 * 1024 * 1024  # Discord's upload limit
+MIN_SCALE = 0.25  # Smallest downscale before frames are dropped to meet the size budget
+SIZE_SAFETY_MARGIN = 0.85  # Fraction of max_bytes the size estimate aims for
+MAX_ENCODE_ATTEMPTS = 3  # Encodes tried, each planned from the last one's real frame sizes, before an oversized GIF is cut short
+
+def render_caption_bar(width: int, overlay_text: str, font, text_color: str = "black", padding: int = 10) -> Image.Image:
+    """Draws the caption centered on a white bar as wide as the GIF."""
+    bbox = font.getbbox(overlay_text)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    bar_height = text_height + 2 * padding
+    bar = Image.new("RGB", (width, bar_height), (255, 255, 255))
+    draw = ImageDraw.Draw(bar)
+    text_x = (width - text_width) // 2
+    text_y = (bar_height - text_height) // 2
+    draw.text((text_x, text_y), overlay_text, font=font, fill=text_color)
+    return bar
+
+def build_palette(bar: Image.Image, frames: list) -> Image.Image:
+    """
+    Quantizes the caption bar plus a downscaled sample of frames once, giving
+    a single palette that every output frame is mapped onto.
+    """
+    step = max(1, len(frames) // PALETTE_SAMPLE_FRAMES)
+    # Nearest-neighbour downscaling keeps the sample to colors that really occur.
+    sample = [
+        frame.resize((frame.width // 2, frame.height // 2), Image.Resampling.NEAREST) if min(frame.size) >= 64 else frame
+        for frame in frames[::step][:PALETTE_SAMPLE_FRAMES]
+    ]
+    width = max([bar.width] + [f.width for f in sample])
+    height = bar.height + sum(f.height for f in sample)
+    montage = Image.new("RGB", (width, height), (255, 255, 255))
+    montage.paste(bar, (0, 0))
+    y = bar.height
+    for frame in sample:
+        montage.paste(frame, (0, y))
+        y += frame.height
+    return montage.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+
+def palette_error(image: Image.Image, palette: Image.Image) -> float:
+    """Mean per-channel error of mapping a (downscaled) image onto a palette."""
+    mapped = image.quantize(palette=palette, dither=Image.Dither.NONE).convert("RGB")
+    return sum(ImageStat.Stat(ImageChops.difference(image, mapped)).mean) / 3
+
+def preview(image: Image.Image) -> Image.Image:
+    """A nearest-neighbour downscaled copy, which only holds colors that really occur."""
+    if min(image.size) < 8 * PALETTE_PREVIEW_SCALE:
+        return image
+    return image.resize((image.width // PALETTE_PREVIEW_SCALE, image.height // PALETTE_PREVIEW_SCALE), Image.Resampling.NEAREST)
+
+class FrameQuantizer:
+    """
+    Maps frames onto a shared palette. Before each frame is mapped, a
+    downscaled copy of it is checked for drift, and only if the colors have
+    drifted too far is the palette rebuilt, from that copy.
+    """
+    def __init__(self, palette: Image.Image):
+        self.palette = palette
+
+    def quantize(self, image: Image.Image) -> Image.Image:
+        small = preview(image)
+        if palette_error(small, self.palette) > PALETTE_MAX_ERROR:
+            self.palette = small.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+        return image.quantize(palette=self.palette, dither=Image.Dither.NONE)
+
+class GifStreamWriter:
+    """
+    Encodes frames into a GIF one at a time, so finished frames are never
+    held in memory. Frames that would push the file past max_bytes are
+    refused; the first frame is always written. Frames are left in place
+    (disposal 1), so a frame may cover only part of the canvas.
+    """
+    def __init__(self, fp, max_bytes: int, animated: bool):
+        self.fp = fp
+        self.max_bytes = max_bytes
+        self.animated = animated
+        self.frames_written = 0
+        self.bytes_written = 0
+
+    def frame_chunks(self, frame: Image.Image, duration=None, offset=(0, 0)) -> list:
+        chunks = []
+        if not self.frames_written:
+            info = {"loop": 0} if self.animated else {}
+            chunks += GifImagePlugin.getheader(frame, info=info)[0]
+        params = {"include_color_table": True}
+        if self.animated:
+            params.update(duration=duration, disposal=1)
+        chunks += GifImagePlugin.getdata(frame, offset, **params)
+        return chunks
+
+    def add(self, frame: Image.Image, duration=None, offset=(0, 0)) -> bool:
+        """Writes a palette-mode frame at offset. Returns False if it would not fit."""
+        chunks = self.frame_chunks(frame, duration, offset)
+        size = sum(len(chunk) for chunk in chunks)
+        if self.frames_written and self.bytes_written + size + 1 > self.max_bytes:
+            return False
+        for chunk in chunks:
+            self.fp.write(chunk)
+        self.bytes_written += size
+        self.frames_written += 1
+        return True
+
+    def close(self):
+        self.fp.write(b";")  # trailer
+        self.bytes_written += 1
+
+def _skip_sub_blocks(data: bytes, pos: int) -> int:
+    while data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+def split_gif(data: bytes) -> tuple:
+    """
+    Splits a GIF into its logical screen (width, height, the raw screen
+    descriptor and global color table) and its frames, without decoding any
+    pixels. Each frame is a list of raw blocks: its extensions followed by
+    its image. Raises ValueError for anything it cannot split cleanly.
+    """
+    try:
+        if data[:6] not in (b"GIF87a", b"GIF89a"):
+            raise ValueError("Not a GIF")
+        width, height, flags = struct.unpack_from("<HHB", data, 6)
+        pos = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+        screen = data[6:pos]
+        frames, blocks = [], []
+        while data[pos] != 0x3B:  # trailer
+            start = pos
+            if data[pos] == 0x21:  # extension
+                if data[pos + 1] == 0x01:
+                    raise ValueError("Plain text extensions are not supported")
+                pos = _skip_sub_blocks(data, pos + 2)
+                blocks.append(data[start:pos])
+            elif data[pos] == 0x2C:  # image
+                image_flags = data[pos + 9]
+                pos += 10 + (3 << ((image_flags & 7) + 1) if image_flags & 0x80 else 0)
+                pos = _skip_sub_blocks(data, pos + 1)  # after the LZW minimum code size
+                frames.append(blocks + [data[start:pos]])
+                blocks = []
+            else:
+                raise ValueError(f"Unexpected block 0x{data[pos]:02x}")
+    except (IndexError, struct.error) as e:
+        raise ValueError("Truncated GIF") from e
+    return width, height, screen, frames
+
+def frame_disposal(frame: list) -> int:
+    """Disposal method from a split frame's graphic control extension (0 if it has none)."""
+    for block in frame:
+        if block[:2] == b"\x21\xf9":
+            return (block[3] >> 2) & 7
+    return 0
+
+def is_loop_extension(block: bytes) -> bool:
+    return block[:3] == b"\x21\xff\x0b" and block[3:14] in (b"NETSCAPE2.0", b"ANIMEXTS1.0")
+
+def overlay_without_reencoding(data: bytes, first_frame: Image.Image, duration, bar: Image.Image):
+    """
+    Puts the caption bar above an animated GIF by re-encoding only the first
+    frame (with the bar) and copying every later frame's compressed data,
+    moved down by the bar's height. Returns the new GIF's bytes, or None if
+    the GIF cannot be split or its first frame is disposed of, since the
+    bar drawn with it would then be cleared.
+    """
+    try:
+        width, height, screen, frames = split_gif(data)
+    except ValueError:
+        return None
+    if len(frames) < 2 or frame_disposal(frames[0]) > 1 or first_frame.size != (width, height):
+        return None
+    head = [b"GIF89a", struct.pack("<HH", width, height + bar.height), screen[4:]]
+    # Always loop, like the re-encoded output. The first frame's other extensions (comments) are kept.
+    head.append(LOOP_EXTENSION)
+    head += [block for block in frames[0][:-1] if block[:2] != b"\x21\xf9" and not is_loop_extension(block)]
+    canvas = Image.new("RGB", (width, height + bar.height), (255, 255, 255))
+    canvas.paste(bar, (0, 0))
+    canvas.paste(flatten_frame(first_frame, (width, height)), (0, bar.height))
+    quantized = canvas.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+    head += GifImagePlugin.getdata(quantized, include_color_table=True, duration=duration, disposal=1)
+    chunks = head
+    for frame in frames[1:]:
+        image = frame[-1]
+        top = struct.unpack_from("<H", image, 3)[0] + bar.height
+        chunks += [block for block in frame[:-1] if not is_loop_extension(block)] + [image[:3], struct.pack("<H", top), image[5:]]
+    chunks.append(b";")
+    return b"".join(chunks)
+
+def flatten_frame(frame: Image.Image, size: tuple) -> Image.Image:
+    """
+    Composites a frame over white and scales it to size. Always returns a new
+    image: the frame iterator seeks the source in place, so it must not be kept.
+    """
+    if frame.mode != "RGB":
+        rgba = frame.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, (0, 0), rgba)
+    else:
+        flat = frame
+    if flat.size != size:
+        return flat.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return flat.copy() if flat is frame else flat
+
+def max_scale(size: tuple) -> float:
+    """Scale that brings a frame of the given size within MAX_FRAME_PIXELS (never enlarging)."""
+    return min(1.0, math.sqrt(MAX_FRAME_PIXELS / (size[0] * size[1])))
+
+def plan_output(original_gif, n_frames: int, max_bytes: int, probe) -> tuple:
+    """
+    Picks a scale factor and frame step so the output lands under max_bytes.
+    probe(scale) returns the average encoded size of an output frame at that
+    scale; every frame after the first covers the whole image.
+    Frames are shrunk (down to MIN_SCALE) before any are dropped.
+    """
+    scale = max_scale(original_gif.size)
+    step = math.ceil(n_frames / MAX_FRAMES)
+    estimate = probe(scale) * math.ceil(n_frames / step)
+    budget = max_bytes * SIZE_SAFETY_MARGIN
+    if estimate > budget:
+        area_factor = max(budget / estimate, (MIN_SCALE / scale) ** 2 if scale > MIN_SCALE else 1.0)
+        scale *= math.sqrt(area_factor)
+        remaining = budget / (estimate * area_factor)
+        if remaining < 1:
+            step = math.ceil(step / remaining)
+    return scale, step
+
+def overlay_text_on_gif(gif_data: bytes, font_name: str, overlay_text: str, font_size: int = None, text_color: str = "black", padding: int = 10, max_bytes: int = MAX_OUTPUT_BYTES) -> BytesIO:
     """
     Overlays the specified text on top of a GIF image.
     Returns a BytesIO object containing the new GIF.
-    
+
+    Frames are decoded, composited and encoded one at a time, so memory use
+    does not grow with the length of the GIF. Large inputs are capped at
+    MAX_FRAME_PIXELS per frame and MAX_FRAMES frames, and the output is
+    downscaled or thinned out (dropped frames add their duration to the
+    kept one) so that it fits in max_bytes. The size is estimated from frames
+    sampled across the animation; if the output still overflows it is encoded
+    again at a smaller scale or with more frames dropped.
+
+    When an animated GIF needs no scaling or dropped frames, only its first
+    frame is re-encoded and the rest are copied (see overlay_without_reencoding).
+    Otherwise the caption bar is drawn and encoded once, in the first frame; later
+    frames only cover the image below it. Frames are mapped onto a shared
+    palette that is only rebuilt when the colors drift, instead of redrawing
+    and adaptively quantizing each frame.
+
     :param gif_data: The original GIF data in bytes.
-    :param font_path: Path to the .ttf font file.
+    :param font_name: Name of a font in the font registry (see utils.fonts); the built-in font is used if none are installed.
     :param overlay_text: The text to overlay on the GIF.
-    :param font_size: Size of the font.
+    :param font_size: Size of the font, or None to fit the text to the GIF width.
     :param text_color: Color of the text.
     :param padding: Padding around the text.
+    :param max_bytes: Size the output must stay under.
     """
     gif_bytes = BytesIO(gif_data)
     try:
         original_gif = Image.open(gif_bytes)
     except Exception as e:
         raise ValueError("Invalid GIF data provided") from e
-    
-    # Try to load the specified font, fallback to default if it fails.
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except Exception:
-        font = ImageFont.load_default()
-    
-    # Determine the size needed for the text overlay.
-    bbox = font.getbbox(overlay_text)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-    bar_height = text_height + 2 * padding
-    
-    frames = []
-    durations = []
-    
-    is_animated = getattr(original_gif, "is_animated", False) and getattr(original_gif, "n_frames", 1) > 1
-    if is_animated:
-        for frame in ImageSequence.Iterator(original_gif):
-            frame = frame.convert("RGBA")
-            width, height = frame.size
-            new_frame = Image.new("RGBA", (width, height + bar_height), (255, 255, 255, 255))
-            draw = ImageDraw.Draw(new_frame)
-            # Center the text in the top bar.
-            text_x = (width - text_width) // 2
-            text_y = (bar_height - text_height) // 2
-            draw.text((text_x, text_y), overlay_text, font=font, fill=text_color)
-            new_frame.paste(frame, (0, bar_height), frame)
-            final_frame = new_frame.convert("P", palette=Image.ADAPTIVE)
-            frames.append(final_frame)
-            durations.append(frame.info.get('duration', 100))
-    else:
-        frame = original_gif.convert("RGBA")
-        width, height = frame.size
-        new_frame = Image.new("RGBA", (width, height + bar_height), (255, 255, 255, 255))
-        draw = ImageDraw.Draw(new_frame)
-        text_x = (width - text_width) // 2
-        text_y = (bar_height - text_height) // 2
-        draw.text((text_x, text_y), overlay_text, font=font, fill=text_color)
-        new_frame.paste(frame, (0, bar_height), frame)
-        final_frame = new_frame.convert("P", palette=Image.ADAPTIVE)
-        frames.append(final_frame)
-        durations.append(original_gif.info.get('duration', 100))
-    
-    output_buffer = BytesIO()
-    if len(frames) > 1:
-        frames[0].save(
-            output_buffer,
-            format="GIF",
-            save_all=True,
-            append_images=frames[1:],
-            loop=0,
-            duration=durations,
-            disposal=2
+    if not has_font(font_name):
+        raise ValueError(f"Unknown font '{font_name}'")
+
+    n_frames = getattr(original_gif, "n_frames", 1)
+    is_animated = getattr(original_gif, "is_animated", False) and n_frames > 1
+
+    def caption_bar(width: int) -> Image.Image:
+        if font_size is None:
+            font = fit_font(font_name, overlay_text, width - 2 * padding)
+        else:
+            font = load_font(font_name, font_size)
+        return render_caption_bar(width, overlay_text, font, text_color, padding)
+
+    def frame_size(scale: float) -> tuple:
+        return max(1, round(original_gif.width * scale)), max(1, round(original_gif.height * scale))
+
+    if is_animated and original_gif.width * original_gif.height <= MAX_FRAME_PIXELS and n_frames <= MAX_FRAMES:
+        remixed = overlay_without_reencoding(
+            gif_data, original_gif, original_gif.info.get('duration', 100), caption_bar(original_gif.width)
         )
-    else:
-        frames[0].save(output_buffer, format="GIF")
-    
-    output_buffer.seek(0)
+        if remixed is not None and len(remixed) <= max_bytes:
+            return BytesIO(remixed)
+
+    def compose(bar: Image.Image, flat: Image.Image) -> Image.Image:
+        canvas = Image.new("RGB", (bar.width, bar.height + flat.height), (255, 255, 255))
+        canvas.paste(bar, (0, 0))
+        canvas.paste(flat, (0, bar.height))
+        return canvas
+
+    # Frames spread over the whole animation, so a plain first frame can't skew the size estimate.
+    base_size = frame_size(max_scale(original_gif.size))
+    sample_step = max(1, n_frames // PALETTE_SAMPLE_FRAMES)
+    samples = []
+    for index, frame in enumerate(ImageSequence.Iterator(original_gif) if is_animated else [original_gif]):
+        if index % sample_step == 0:
+            samples.append(flatten_frame(frame, base_size))
+            if len(samples) == PALETTE_SAMPLE_FRAMES:
+                break
+
+    def probe(scale: float) -> int:
+        total = 0
+        for sample in samples:
+            flat = flatten_frame(sample, frame_size(scale))
+            quantized = flat.quantize(palette=preview(flat).quantize(colors=256, method=Image.Quantize.MEDIANCUT), dither=Image.Dither.NONE)
+            total += sum(len(chunk) for chunk in GifImagePlugin.getdata(quantized, include_color_table=True, duration=100, disposal=1))
+        return total / len(samples)
+
+    def encode(scale: float, step: int) -> tuple:
+        """Streams the output at one scale and frame step. Returns (buffer, writer, whether every frame fit)."""
+        size = frame_size(scale)
+        bar = caption_bar(size[0])
+        output_buffer = BytesIO()
+        writer = GifStreamWriter(output_buffer, max_bytes, is_animated)
+        source_frames = ImageSequence.Iterator(original_gif) if is_animated else [original_gif]
+        lookahead = []  # The first kept frames, buffered to build the shared palette
+        quantizer = None
+        pending = None  # [flat frame, accumulated duration] waiting for its dropped followers
+        full = False
+
+        def write(flat: Image.Image, duration) -> bool:
+            if not writer.frames_written:
+                return writer.add(quantizer.quantize(compose(bar, flat)), duration)
+            return writer.add(quantizer.quantize(flat), duration, offset=(0, bar.height))
+
+        def emit(flat: Image.Image, duration) -> bool:
+            nonlocal quantizer
+            if quantizer is None:
+                lookahead.append((flat, duration))
+                if len(lookahead) < PALETTE_SAMPLE_FRAMES:
+                    return True
+                quantizer = FrameQuantizer(build_palette(bar, [f for f, _ in lookahead]))
+                buffered = lookahead[:]
+                lookahead.clear()
+                return all(write(f, d) for f, d in buffered)
+            return write(flat, duration)
+
+        # The iterator seeks the same Image in place; flatten_frame copies each frame out as it is visited.
+        for index, frame in enumerate(source_frames):
+            duration = frame.info.get('duration', 100)
+            if index % step:
+                if pending is not None:
+                    pending[1] += duration
+                continue
+            if pending is not None and not emit(*pending):
+                full = True
+                break
+            pending = [flatten_frame(frame, size), duration]
+        if not full and pending is not None:
+            full = not emit(*pending)
+        if quantizer is None and lookahead:
+            quantizer = FrameQuantizer(build_palette(bar, [f for f, _ in lookahead]))
+            full = not all(write(flat, duration) for flat, duration in lookahead)
+        writer.close()
+        output_buffer.seek(0)
+        return output_buffer, writer, not full
+
+    scale, step = plan_output(original_gif, n_frames, max_bytes, probe)
+    for attempt in range(MAX_ENCODE_ATTEMPTS):
+        output_buffer, writer, complete = encode(scale, step)
+        if complete or attempt == MAX_ENCODE_ATTEMPTS - 1:
+            break
+        # Frames came out larger than the samples suggested; plan again from what was actually written.
+        frame_bytes, measured_scale = writer.bytes_written / writer.frames_written, scale
+        new_scale, new_step = plan_output(
+            original_gif, n_frames, max_bytes, lambda s: frame_bytes * (s / measured_scale) ** 2
+        )
+        if new_scale >= scale and new_step <= step:
+            new_step = step + 1
+        scale, step = new_scale, new_step
     return output_buffer
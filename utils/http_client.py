@@ -0,0 +1,91 @@
+import json
+import time
+import aiohttp
+
+CONNECT_TIMEOUT = 5  # Seconds to establish a connection
+READ_TIMEOUT = 20  # Seconds allowed between received chunks
+MAX_CONNECTIONS = 50
+DEFAULT_MAX_BYTES = 25 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+class HTTPError(Exception):
+    """Raised when a request fails or returns a non-2xx status."""
+
+class ResponseTooLarge(HTTPError):
+    """Raised when a response body exceeds the allowed size."""
+
+class HttpClient:
+    """
+    One pooled aiohttp session shared by every cog.
+    Bodies are streamed and cut off at max_bytes, and request counts,
+    latency and received bytes are tallied for stats().
+    """
+    def __init__(self):
+        self.session = None
+        self.requests = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.total_latency = 0.0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ttl_dns_cache=300, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def get_bytes(self, url: str, max_bytes: int = DEFAULT_MAX_BYTES) -> bytes:
+        """Downloads url, raising ResponseTooLarge past max_bytes and HTTPError on failure."""
+        started = time.monotonic()
+        self.requests += 1
+        try:
+            async with self._get_session().get(url) as response:
+                if response.status >= 300:
+                    raise HTTPError(f"{url} returned HTTP {response.status}")
+                if response.content_length and response.content_length > max_bytes:
+                    raise ResponseTooLarge(f"{url} is larger than {max_bytes} bytes")
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    body += chunk
+                    self.bytes_received += len(chunk)
+                    if len(body) > max_bytes:
+                        raise ResponseTooLarge(f"{url} is larger than {max_bytes} bytes")
+                return bytes(body)
+        except HTTPError:
+            self.errors += 1
+            raise
+        except (aiohttp.ClientError, TimeoutError) as e:
+            self.errors += 1
+            raise HTTPError(f"Request to {url} failed: {e}") from e
+        finally:
+            self.total_latency += time.monotonic() - started
+
+    async def get_json(self, url: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Downloads url and decodes it as JSON."""
+        body = await self.get_bytes(url, max_bytes)
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise HTTPError(f"{url} did not return valid JSON") from e
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_received": self.bytes_received,
+            "avg_latency_ms": round(1000 * self.total_latency / self.requests, 1) if self.requests else 0.0,
+        }
+
+_client = None
+
+def get_http_client() -> HttpClient:
+    """Returns the process-wide HttpClient, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
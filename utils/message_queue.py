@@ -0,0 +1,50 @@
+from utils.file_io import load_json, save_json
+
+class MessageQueue:
+    """
+    Bounded FIFO queues of (text, user id) pairs, one per channel, saved to a
+    JSON file on every change so queued messages survive reloads and restarts.
+    """
+    def __init__(self, path: str, max_messages: int):
+        self.path = path
+        self.max_messages = max_messages
+        saved = load_json(path) or {}
+        self.queues = {int(channel_id): [tuple(item) for item in items] for channel_id, items in saved.items()}
+
+    def save(self):
+        save_json(self.path, {str(channel_id): items for channel_id, items in self.queues.items() if items})
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self.queues.values())
+
+    def size(self, channel_id: int) -> int:
+        return len(self.queues.get(channel_id, ()))
+
+    def is_full(self, channel_id: int) -> bool:
+        return self.size(channel_id) >= self.max_messages
+
+    def channels(self) -> list:
+        """Channel IDs with messages waiting."""
+        return [channel_id for channel_id, items in self.queues.items() if items]
+
+    def add(self, channel_id: int, text: str, user_id: int) -> bool:
+        """Queues a message. Returns False, leaving the queue unchanged, if it is full."""
+        if self.is_full(channel_id):
+            return False
+        self.queues.setdefault(channel_id, []).append((text, user_id))
+        self.save()
+        return True
+
+    def peek(self, channel_id: int) -> list:
+        """Returns every message queued for the channel, leaving them queued."""
+        return list(self.queues.get(channel_id, ()))
+
+    def remove(self, channel_id: int, count: int):
+        """Removes the oldest count messages queued for the channel."""
+        items = self.queues.get(channel_id)
+        if not items or count <= 0:
+            return
+        del items[:count]
+        if not items:
+            del self.queues[channel_id]
+        self.save()
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import discord
+from utils.helpers import get_emoji_str
+
+CRAWL_CONCURRENCY = 4  # Channels scanned at once; discord.py queues requests past the rate limit
+CHECKPOINT_EVERY = 500  # Messages between checkpoints
+PROGRESS_INTERVAL = 10  # Seconds between progress message edits
+
+def _snowflake_ms(snowflake) -> int:
+    """Milliseconds since the Discord epoch encoded in a snowflake ID."""
+    return (snowflake or 0) >> 22
+
+class ReactionCrawler:
+    """
+    Scans guild history into a ReactionStore, several channels at a time.
+    Each channel is read oldest-first and checkpointed by last message ID,
+    so an interrupted crawl resumes where it stopped.
+    """
+    def __init__(self, store, channels, concurrency: int = CRAWL_CONCURRENCY):
+        self.store = store
+        self.channels = channels
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.checkpoints = store.crawl_checkpoints()
+        self.positions = {c.id: self.checkpoints.get(c.id, (None, False))[0] for c in self.channels}
+        self.messages_scanned = 0
+        self.reactions_updated = 0
+        self.started_at = time.monotonic()
+        self.start_fraction = self.fraction_done()
+
+    def fraction_done(self) -> float:
+        """Estimates overall progress from how far each channel has advanced in time."""
+        total = 0
+        done = 0
+        for channel in self.channels:
+            start = _snowflake_ms(channel.id)
+            end = max(_snowflake_ms(channel.last_message_id), start)
+            position = self.positions.get(channel.id)
+            if self.checkpoints.get(channel.id, (None, False))[1]:
+                position = channel.last_message_id
+            total += end - start
+            done += min(max(_snowflake_ms(position) - start, 0), end - start)
+        return done / total if total else 1.0
+
+    def progress_text(self) -> str:
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        rate = self.messages_scanned / elapsed
+        fraction = self.fraction_done()
+        gained = fraction - self.start_fraction
+        if gained > 0:
+            eta = f"{int(elapsed * (1 - fraction) / gained)}s"
+        else:
+            eta = "unknown"
+        return (
+            f"Rebuilding reactions: {fraction:.1%} done, {self.messages_scanned} messages "
+            f"({rate:.1f} msg/s), {self.reactions_updated} reactions, ETA {eta}"
+        )
+
+    async def crawl_channel(self, channel):
+        last_id, done = self.checkpoints.get(channel.id, (None, False))
+        if done:
+            return
+        async with self.semaphore:
+            after = discord.Object(id=last_id) if last_id else None
+            since_checkpoint = 0
+            try:
+                async for message_obj in channel.history(limit=None, after=after, oldest_first=True):
+                    author_id = message_obj.author.id if message_obj.author else None
+                    self.store.upsert_message(message_obj.id, author_id, channel.id)
+                    for reaction in message_obj.reactions:
+                        emoji_str = get_emoji_str(reaction.emoji)
+                        user_ids = [user.id async for user in reaction.users()]
+                        self.store.add_reactions(message_obj.id, emoji_str, user_ids)
+                        self.reactions_updated += len(user_ids)
+                    self.messages_scanned += 1
+                    self.positions[channel.id] = message_obj.id
+                    since_checkpoint += 1
+                    if since_checkpoint >= CHECKPOINT_EVERY:
+                        self.store.checkpoint(channel.id, message_obj.id)
+                        since_checkpoint = 0
+            except discord.Forbidden:
+                pass
+            self.store.checkpoint(channel.id, self.positions[channel.id], done=True)
+            self.checkpoints[channel.id] = (self.positions[channel.id], True)
+
+    async def report_progress(self, progress_message):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            try:
+                await progress_message.edit(content=self.progress_text())
+            except discord.HTTPException:
+                pass
+
+    async def run(self, progress_message=None):
+        """Crawls every channel, editing progress_message periodically if given."""
+        reporter = None
+        if progress_message is not None:
+            reporter = asyncio.create_task(self.report_progress(progress_message))
+        try:
+            await asyncio.gather(*(self.crawl_channel(channel) for channel in self.channels))
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+        self.store.finish_crawl()
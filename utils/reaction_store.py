@@ -0,0 +1,215 @@
+import sqlite3
+
+REACTION_DB_FILE = "reaction_data.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY,
+    author_id INTEGER,
+    channel_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS reactions (
+    message_id INTEGER NOT NULL,
+    emoji TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (message_id, emoji, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS given_totals (
+    user_id INTEGER NOT NULL,
+    emoji TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, emoji)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS received_totals (
+    user_id INTEGER NOT NULL,
+    emoji TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, emoji)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+    channel_id INTEGER PRIMARY KEY,
+    last_message_id INTEGER,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS given_totals_emoji ON given_totals (emoji, count);
+CREATE INDEX IF NOT EXISTS received_totals_emoji ON received_totals (emoji, count);
+
+-- Aggregates are kept in step with the raw reaction rows by triggers, so every
+-- insert or delete costs O(log n) and lookups never touch the full history.
+CREATE TRIGGER IF NOT EXISTS reaction_added AFTER INSERT ON reactions BEGIN
+    INSERT INTO given_totals (user_id, emoji, count) VALUES (NEW.user_id, NEW.emoji, 1)
+        ON CONFLICT (user_id, emoji) DO UPDATE SET count = count + 1;
+    INSERT INTO received_totals (user_id, emoji, count)
+        SELECT author_id, NEW.emoji, 1 FROM messages
+        WHERE message_id = NEW.message_id AND author_id IS NOT NULL AND author_id != NEW.user_id
+        ON CONFLICT (user_id, emoji) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS reaction_removed AFTER DELETE ON reactions BEGIN
+    UPDATE given_totals SET count = count - 1
+        WHERE user_id = OLD.user_id AND emoji = OLD.emoji;
+    UPDATE received_totals SET count = count - 1
+        WHERE emoji = OLD.emoji AND user_id = (
+            SELECT author_id FROM messages
+            WHERE message_id = OLD.message_id AND author_id != OLD.user_id
+        );
+END;
+-- Reactions seen before the author was known are credited once it is.
+CREATE TRIGGER IF NOT EXISTS author_resolved AFTER UPDATE OF author_id ON messages
+WHEN OLD.author_id IS NULL AND NEW.author_id IS NOT NULL BEGIN
+    INSERT INTO received_totals (user_id, emoji, count)
+        SELECT NEW.author_id, emoji, COUNT(*) FROM reactions
+        WHERE message_id = NEW.message_id AND user_id != NEW.author_id
+        GROUP BY emoji
+        ON CONFLICT (user_id, emoji) DO UPDATE SET count = count + excluded.count;
+END;
+"""
+
+class ReactionStore:
+    """
+    SQLite-backed reaction ledger.
+    Stores one row per (message, emoji, user) plus per-user/per-emoji totals,
+    so credit/debit/balance lookups are indexed and updates are row-level.
+    Writes are not committed until commit() is called.
+    """
+    def __init__(self, path: str = REACTION_DB_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.pending_writes = 0
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        """Commits pending writes and closes the database."""
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_writes = 0
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is None
+
+    def clear(self):
+        """Removes every message, reaction and total."""
+        self.conn.executescript(
+            "DELETE FROM reactions; DELETE FROM messages; "
+            "DELETE FROM given_totals; DELETE FROM received_totals; DELETE FROM crawl_checkpoints;"
+        )
+        self.commit()
+
+    def crawl_checkpoints(self) -> dict:
+        """Returns {channel_id: (last_message_id, done)} for the crawl in progress."""
+        rows = self.conn.execute("SELECT channel_id, last_message_id, done FROM crawl_checkpoints")
+        return {channel_id: (last_id, bool(done)) for channel_id, last_id, done in rows}
+
+    def start_crawl(self, channel_ids):
+        """Registers the channels of a new crawl, none of them scanned yet."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO crawl_checkpoints (channel_id) VALUES (?)",
+            ((channel_id,) for channel_id in channel_ids)
+        )
+        self.commit()
+
+    def checkpoint(self, channel_id: int, last_message_id, done: bool = False):
+        """Records crawl progress and commits it together with the data scanned so far."""
+        self.conn.execute(
+            "UPDATE crawl_checkpoints SET last_message_id = ?, done = ? WHERE channel_id = ?",
+            (last_message_id, int(done), channel_id)
+        )
+        self.commit()
+
+    def finish_crawl(self):
+        self.conn.execute("DELETE FROM crawl_checkpoints")
+        self.commit()
+
+    def upsert_message(self, message_id: int, author_id, channel_id=None):
+        """Records a message and its author. A known author is never overwritten."""
+        self.conn.execute(
+            "INSERT INTO messages (message_id, author_id, channel_id) VALUES (?, ?, ?) "
+            "ON CONFLICT (message_id) DO UPDATE SET "
+            "author_id = COALESCE(messages.author_id, excluded.author_id), "
+            "channel_id = COALESCE(messages.channel_id, excluded.channel_id)",
+            (message_id, author_id, channel_id)
+        )
+        self.pending_writes += 1
+
+    def add_reaction(self, message_id: int, emoji: str, user_id: int):
+        """Adds a single reaction. A duplicate is ignored."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO reactions (message_id, emoji, user_id) VALUES (?, ?, ?)",
+            (message_id, emoji, user_id)
+        )
+        self.pending_writes += 1
+
+    def remove_reaction(self, message_id: int, emoji: str, user_id: int):
+        """Removes a single reaction if it was recorded."""
+        self.conn.execute(
+            "DELETE FROM reactions WHERE message_id = ? AND emoji = ? AND user_id = ?",
+            (message_id, emoji, user_id)
+        )
+        self.pending_writes += 1
+
+    def clear_reactions(self, message_id: int, emoji: str = None):
+        """Removes every reaction on a message, or only those for one emoji."""
+        if emoji is None:
+            self.conn.execute("DELETE FROM reactions WHERE message_id = ?", (message_id,))
+        else:
+            self.conn.execute(
+                "DELETE FROM reactions WHERE message_id = ? AND emoji = ?",
+                (message_id, emoji)
+            )
+        self.pending_writes += 1
+
+    def add_reactions(self, message_id: int, emoji: str, user_ids):
+        """Adds reactions from several users. Duplicates are ignored."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO reactions (message_id, emoji, user_id) VALUES (?, ?, ?)",
+            ((message_id, emoji, user_id) for user_id in user_ids)
+        )
+        self.pending_writes += 1
+
+    def delete_message(self, message_id: int):
+        """Removes a message and reverses every reaction recorded on it."""
+        self.conn.execute("DELETE FROM reactions WHERE message_id = ?", (message_id,))
+        self.conn.execute("DELETE FROM messages WHERE message_id = ?", (message_id,))
+        self.pending_writes += 1
+
+    def _totals(self, table: str, user_id: int) -> dict:
+        rows = self.conn.execute(
+            f"SELECT emoji, count FROM {table} WHERE user_id = ? AND count > 0 ORDER BY count DESC",
+            (user_id,)
+        )
+        return dict(rows.fetchall())
+
+    def received_by(self, user_id: int) -> dict:
+        """Returns {emoji: unique users who reacted} across the user's messages."""
+        return self._totals("received_totals", user_id)
+
+    def given_by(self, user_id: int) -> dict:
+        """Returns {emoji: messages the user reacted to}."""
+        return self._totals("given_totals", user_id)
+
+    def balance_of(self, user_id: int) -> dict:
+        """Returns {emoji: received - given} for every emoji with a non-zero balance."""
+        balance = self.received_by(user_id)
+        for emoji, count in self.given_by(user_id).items():
+            balance[emoji] = balance.get(emoji, 0) - count
+        return {emoji: net for emoji, net in balance.items() if net != 0}
+
+    def import_json(self, data: dict):
+        """
+        Imports the legacy reaction_data.json layout:
+        {message_id: {"author_id": ..., "reactions": {emoji: {"users_given": [...]}}}}
+        """
+        for msg_id, info in data.items():
+            if "reactions" not in info:
+                continue
+            author_id = info.get("author_id")
+            author_id = int(author_id) if author_id and str(author_id).isdigit() else None
+            self.upsert_message(int(msg_id), author_id)
+            for emoji, details in info["reactions"].items():
+                self.add_reactions(int(msg_id), emoji, (int(u) for u in details.get("users_given", [])))
+        self.commit()
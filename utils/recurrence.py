@@ -0,0 +1,94 @@
+import re
+from datetime import datetime, timedelta
+
+NAMED_INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+INTERVAL_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+# (low, high) bounds for minute, hour, day of month, month, day of week (0 or 7 = Sunday, as in crontab)
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def _parse_cron_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Cron field '{field}' is out of range {low}-{high}.")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_rule(rule: str):
+    """
+    Validates a recurrence rule and returns its parsed form.
+    Supported rules: hourly, daily, weekly, every:<N><m|h|d|w> (e.g. every:90m),
+    and cron:<min> <hour> <day> <month> <weekday> with crontab semantics (0 or 7 = Sunday;
+    a day and a weekday that are both restricted match when either does).
+    Raises ValueError for anything else.
+    """
+    rule = rule.strip().lower()
+    if rule in NAMED_INTERVALS:
+        return NAMED_INTERVALS[rule]
+    match = re.fullmatch(r"every:(\d+)([mhdw])", rule)
+    if match:
+        interval = timedelta(**{INTERVAL_UNITS[match.group(2)]: int(match.group(1))})
+        if interval < timedelta(minutes=1):
+            raise ValueError("Recurring reminders must be at least one minute apart.")
+        return interval
+    if rule.startswith("cron:"):
+        fields = rule[5:].split()
+        if len(fields) != 5:
+            raise ValueError("Cron rules need five fields: minute hour day month weekday.")
+        parsed = [_parse_cron_field(f, low, high) for f, (low, high) in zip(fields, CRON_FIELDS)]
+        if 7 in parsed[4]:
+            parsed[4] = (parsed[4] - {7}) | {0}
+        # As in crontab, when both day fields are restricted (neither starts with "*") either may match.
+        parsed.append(not fields[2].startswith("*") and not fields[4].startswith("*"))
+        return parsed
+    raise ValueError(f"Unknown recurrence rule '{rule}'.")
+
+def _day_matches(candidate: datetime, days: set, weekdays: set, either_day: bool) -> bool:
+    day_ok = candidate.day in days
+    weekday_ok = (candidate.weekday() + 1) % 7 in weekdays
+    return day_ok or weekday_ok if either_day else day_ok and weekday_ok
+
+def _next_cron(fields, after: datetime) -> datetime:
+    minutes, hours, days, months, weekdays, either_day = fields
+    candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = candidate + timedelta(days=366 * 5)
+    while candidate < limit:
+        if candidate.month not in months:
+            candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+        # datetime.weekday() counts from Monday = 0; cron counts from Sunday = 0.
+        elif not _day_matches(candidate, days, weekdays, either_day):
+            candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+        elif candidate.hour not in hours:
+            candidate = candidate.replace(minute=0) + timedelta(hours=1)
+        elif candidate.minute not in minutes:
+            candidate += timedelta(minutes=1)
+        else:
+            return candidate
+    raise ValueError("Cron rule never fires.")
+
+def next_fire(rule: str, previous: datetime, now: datetime) -> datetime:
+    """
+    Returns the first fire time of the rule after both previous and now,
+    so occurrences missed while the bot was offline are skipped.
+    """
+    parsed = parse_rule(rule)
+    if isinstance(parsed, timedelta):
+        if previous > now:
+            return previous + parsed
+        missed = (now - previous) // parsed + 1
+        return previous + missed * parsed
+    return _next_cron(parsed, max(previous, now))
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class QueueFullError(Exception):
+    """Raised when a WorkerPool already has its maximum number of jobs pending."""
+
+def _kill(executor: ProcessPoolExecutor):
+    """Terminates an executor's worker processes instead of waiting for their jobs."""
+    # The processes are only reachable privately before Python 3.14's terminate_workers().
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+class WorkerPool:
+    """
+    Runs CPU-heavy jobs in long-lived worker processes, at most `workers` at
+    a time and with a bounded number of pending jobs. Each worker is a
+    single-process executor reused from job to job, so per-process caches
+    stay warm; only a worker whose job runs past the timeout (or whose
+    process died) is killed and replaced, without disturbing the others.
+    """
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(workers)]
+        self.idle = asyncio.Queue()  # Executors not running a job
+        for executor in self.executors:
+            self.idle.put_nowait(executor)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+
+    def shutdown(self):
+        for executor in self.executors:
+            _kill(executor)
+
+    def _replace(self, executor: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        _kill(executor)
+        fresh = ProcessPoolExecutor(max_workers=1)
+        self.executors[self.executors.index(executor)] = fresh
+        return fresh
+
+    async def run(self, func, *args):
+        """
+        Runs func(*args) in a worker process and returns its result.
+        Raises QueueFullError if too many jobs are pending and
+        asyncio.TimeoutError if the job runs longer than the timeout once
+        started, in which case its worker is killed and replaced.
+        func and its arguments must be picklable.
+        """
+        if self.pending >= self.max_pending:
+            raise QueueFullError("The job queue is full.")
+        self.pending += 1
+        try:
+            executor = await self.idle.get()
+            try:
+                future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+                return await asyncio.wait_for(future, timeout=self.timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError, BrokenProcessPool):
+                executor = self._replace(executor)
+                raise
+            finally:
+                self.idle.put_nowait(executor)
+        finally:
+            self.pending -= 1